@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException
+from models import User
+from api.auth import get_current_user, user_cache, password_hasher
+from lookups import user_type, load_lookups
+from database import pool_status, get_async_engine
+from utils.cell_allocator import free_cells
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.user_type != user_type.ADMIN:
+        raise HTTPException(status_code=403, detail="Только для админа")
+    return current_user
+
+
+@router.get("/stats")
+def get_stats(current_user: User = Depends(require_admin)):
+    return {
+        "user_cache": user_cache.stats(),
+        "db_pool": pool_status(),
+        "db_pool_async": pool_status(get_async_engine().sync_engine.pool),
+        "password_hashing": password_hasher.stats(),
+        "free_cells": free_cells.stats(),
+    }
+
+
+@router.post("/lookups/reload")
+def reload_lookups(current_user: User = Depends(require_admin)):
+    load_lookups()
+    return {"message": "Справочники перезагружены"}
@@ -2,15 +2,23 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, EmailStr
+from sqlalchemy import update
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session, select
-from models import User, RegistrationCode
-from database import get_session, engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import User, RegistrationCode, RefreshToken
+from database import get_session, get_async_session
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
 import random
+import secrets
 import string
 from utils.email_sender import send_confirmation_email, send_temporary_password_email
+from utils.ttl_cache import TTLCache
+from utils.password_hasher import PasswordHasher, HasherBusy, HASH_WORKERS, HASH_QUEUE_SIZE
+from lookups import user_type as user_types
 from passlib.context import CryptContext
 import httpx
 import os
@@ -18,11 +26,18 @@ import os
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(pwd_context, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE)
 SECRET_KEY = "smartlocker-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+REFRESH_TOKEN_EXPIRE_DAYS = 30
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# Кэш пользователей по subject токена (email), чтобы не ходить в БД на каждый запрос
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
 CLIENT_ID = "19230-prj"
 CLIENT_SECRET = os.getenv("HSE_CLIENT_SECRET")
 REDIRECT_URI = "smartlocker://auth/callback"
@@ -36,6 +51,7 @@ USERINFO_URL = "https://profile.miem.hse.ru/auth/realms/MIEM/protocol/openid-con
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class ConfirmData(BaseModel):
@@ -63,29 +79,61 @@ class TokenRequest(BaseModel):
     code: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 # ========================
 # УТИЛИТЫ
 # ========================
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# bcrypt (~200 мс CPU) выполняется в отдельном ограниченном пуле (utils/password_hasher.py);
+# если пул и очередь заняты, запрос сразу получает 503 вместо ожидания.
+# Исключение создаётся на каждый отказ: общий объект делил бы __traceback__ между запросами
+def hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Сервер перегружен, попробуйте войти через несколько секунд",
+        headers={"Retry-After": "5"},
+    )
+
+
+async def get_password_hash(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherBusy:
+        raise hasher_busy()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HasherBusy:
+        raise hasher_busy()
 
 
 def get_user_by_email(session: Session, email: str):
     return session.exec(select(User).where(User.email == email)).first()
 
 
-def authenticate_user(email: str, password: str):
-    with Session(engine) as session:
-        user = get_user_by_email(session, email)
-        if not user:
-            raise HTTPException(status_code=401, detail="Пользователь не найден")
-        if not verify_password(password, user.password):
-            raise HTTPException(status_code=401, detail="Неверный пароль")
-        return user
+def user_type_for_email(email: str) -> int:
+    if email.endswith("@edu.hse.ru"):
+        return user_types.STUDENT
+    if email.endswith("@hse.ru"):
+        return user_types.STAFF
+    return 0
+
+
+async def get_user_by_email_async(session: AsyncSession, email: str):
+    return (await session.exec(select(User).where(User.email == email))).first()
+
+
+async def authenticate_user(session: AsyncSession, email: str, password: str):
+    user = await get_user_by_email_async(session, email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    if not await verify_password(password, user.password):
+        raise HTTPException(status_code=401, detail="Неверный пароль")
+    return user
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -95,30 +143,104 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(session, user_id: int) -> str:
+    # Сохраняется в транзакции сессии, коммит — за вызывающим кодом
+    token = secrets.token_urlsafe(48)
+    session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def revoke_refresh_tokens(session: AsyncSession, user_id: int):
+    await session.exec(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+
+
 # ========================
 # АВТОРИЗАЦИЯ
 # ========================
 @router.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+async def login(
+        form_data: OAuth2PasswordRequestForm = Depends(),
+        session: AsyncSession = Depends(get_async_session)
+):
+    user = await authenticate_user(session, form_data.username, form_data.password)
+    refresh_token = issue_refresh_token(session, user.id)
+    await session.commit()
+
+    access_token = create_access_token(data={"sub": user.email})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(data: RefreshRequest, session: AsyncSession = Depends(get_async_session)):
+    # Новый access-токен без проверки пароля; refresh-токен при этом заменяется новым
+    now = datetime.utcnow()
+    stored = (await session.exec(
+        select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(data.refresh_token))
+    )).first()
+    if not stored or stored.expires_at < now:
+        raise HTTPException(status_code=401, detail="Недействительный refresh-токен")
+
+    # Условный UPDATE: из двух одновременных запросов с одним токеном пройдёт только один
+    revoked = await session.exec(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    if revoked.rowcount != 1:
+        # Повторное использование отозванного токена — вероятная утечка, отзываем все токены пользователя
+        await revoke_refresh_tokens(session, stored.user_id)
+        await session.commit()
+        raise HTTPException(status_code=401, detail="Недействительный refresh-токен")
+
+    user = await session.get(User, stored.user_id)
+    if not user or not user.active:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+
+    refresh_token = issue_refresh_token(session, user.id)
+    await session.commit()
+
     access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@router.post("/logout")
+async def logout(data: RefreshRequest, session: AsyncSession = Depends(get_async_session)):
+    await session.exec(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == hash_refresh_token(data.refresh_token), RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    await session.commit()
+    return {"message": "Выход выполнен"}
 
 
 @router.post("/exchange")
-def exchange_token(data: TokenRequest, session: Session = Depends(get_session)):
+async def exchange_token(data: TokenRequest, session: AsyncSession = Depends(get_async_session)):
     try:
-        token_response = httpx.post(
-            TOKEN_URL,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-            data={
-                "grant_type": "authorization_code",
-                "code": data.code,
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "redirect_uri": REDIRECT_URI,
-            },
-        )
+        async with httpx.AsyncClient() as client:
+            token_response = await client.post(
+                TOKEN_URL,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                data={
+                    "grant_type": "authorization_code",
+                    "code": data.code,
+                    "client_id": CLIENT_ID,
+                    "client_secret": CLIENT_SECRET,
+                    "redirect_uri": REDIRECT_URI,
+                },
+            )
         token_response.raise_for_status()
         token_data = token_response.json()
         hse_access_token = token_data["access_token"]
@@ -127,10 +249,11 @@ def exchange_token(data: TokenRequest, session: Session = Depends(get_session)):
         raise HTTPException(status_code=400, detail="Ошибка получения токена от HSE")
 
     try:
-        userinfo_res = httpx.get(
-            USERINFO_URL,
-            headers={"Authorization": f"Bearer {hse_access_token}"},
-        )
+        async with httpx.AsyncClient() as client:
+            userinfo_res = await client.get(
+                USERINFO_URL,
+                headers={"Authorization": f"Bearer {hse_access_token}"},
+            )
         userinfo_res.raise_for_status()
         userinfo = userinfo_res.json()
         email = userinfo.get("email")
@@ -140,26 +263,34 @@ def exchange_token(data: TokenRequest, session: Session = Depends(get_session)):
 
         email_prefix = email.split("@")[0]
 
-        user = session.exec(
+        user = (await session.exec(
             select(User).where(User.email.startswith(email_prefix))
-        ).first()
+        )).first()
 
         if not user:
-            user_type = 1 if email.endswith("@edu.hse.ru") else 2 if email.endswith("@hse.ru") else 0
+            user_type = user_type_for_email(email)
             user = User(
                 email=email,
                 name=name,
-                password=get_password_hash('default-password'),  # временный
+                password=await get_password_hash('default-password'),  # временный
                 active=True,
                 email_verified=True,
                 user_type=user_type
             )
             session.add(user)
-            session.commit()
+            await session.flush()
+
+        refresh_token = issue_refresh_token(session, user.id)
+        await session.commit()
 
         access_token = create_access_token(data={"sub": user.email})
-        return {"access_token": access_token}
+        return {"access_token": access_token, "refresh_token": refresh_token}
 
+    except HTTPException as e:
+        if e.status_code == 503:
+            raise
+        print("[userinfo error]", e)
+        raise HTTPException(status_code=400, detail="Ошибка получения данных пользователя")
     except Exception as e:
         print("[userinfo error]", e)
         raise HTTPException(status_code=400, detail="Ошибка получения данных пользователя")
@@ -204,24 +335,70 @@ def auth_done(token: Optional[str] = None):
 # ========================
 # ТЕКУЩИЙ ПОЛЬЗОВАТЕЛЬ
 # ========================
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def get_token_subject(token: str) -> str:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if not email:
             raise HTTPException(status_code=401, detail="Недействительный токен")
+        return email
     except JWTError:
         raise HTTPException(status_code=401, detail="Недействительный токен")
 
-    with Session(engine) as session:
-        user = get_user_by_email(session, email)
-        if not user:
-            raise HTTPException(status_code=401, detail="Пользователь не найден")
-        return user
+
+def cache_user(email: str, user: User):
+    # В кэше лежат только поля строки: общий объект User менялся бы из всех запросов сразу
+    user_cache.set(email, user.model_dump())
+
+
+def cached_user(data: dict) -> User:
+    # Свой экземпляр на каждый запрос, помеченный как уже сохранённый, — merge(load=False) без SELECT
+    user = User.model_validate(data)
+    make_transient_to_detached(user)
+    return user
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> User:
+    # Та же сессия, что и у обработчика (Depends кэшируется в рамках запроса):
+    # на запрос берётся одно соединение, а пользователь привязан к этой сессии и при попадании в кэш
+    email = get_token_subject(token)
+
+    data = user_cache.get(email)
+    if data is not None:
+        return session.merge(cached_user(data), load=False)
+
+    user = get_user_by_email(session, email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    cache_user(email, user)
+    return user
+
+
+async def get_current_user_async(
+        token: str = Depends(oauth2_scheme),
+        session: AsyncSession = Depends(get_async_session)
+) -> User:
+    # Вариант get_current_user для async-эндпоинтов: не занимает поток из threadpool
+    email = get_token_subject(token)
+
+    data = user_cache.get(email)
+    if data is not None:
+        return await session.merge(cached_user(data), load=False)
+
+    user = await get_user_by_email_async(session, email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    cache_user(email, user)
+    return user
+
+
+def invalidate_user(email: str):
+    # Вызывать после смены пароля, удаления аккаунта или смены user_type
+    user_cache.invalidate(email)
 
 
 @router.get("/me")
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user_async)):
     return {
         "id": current_user.id,
         "email": current_user.email,
@@ -239,13 +416,12 @@ def send_code(email: str, session: Session = Depends(get_session)):
     existing = session.exec(select(RegistrationCode).where(RegistrationCode.email == email)).first()
     if existing:
         session.delete(existing)
-        session.commit()
 
     session.add(RegistrationCode(email=email, code=code))
-    session.commit()
-
+    # Код и письмо с ним сохраняются одной транзакцией
+    send_confirmation_email(email, code, session=session)
     try:
-        send_confirmation_email(email, code)
+        session.commit()
     except Exception:
         raise HTTPException(status_code=500, detail="Ошибка при отправке письма")
 
@@ -253,52 +429,60 @@ def send_code(email: str, session: Session = Depends(get_session)):
 
 
 @router.post("/confirm-code")
-def confirm_code(data: ConfirmData, session: Session = Depends(get_session)):
-    code_entry = session.exec(select(RegistrationCode).where(RegistrationCode.email == data.email)).first()
+async def confirm_code(data: ConfirmData, session: AsyncSession = Depends(get_async_session)):
+    code_entry = (await session.exec(
+        select(RegistrationCode).where(RegistrationCode.email == data.email)
+    )).first()
 
     if not code_entry or code_entry.code != data.code:
         raise HTTPException(status_code=400, detail="Неверный код")
 
-    if session.exec(select(User).where(User.email == data.email)).first():
+    if await get_user_by_email_async(session, data.email):
         raise HTTPException(status_code=400, detail="Пользователь уже существует")
 
-    user_type = 1 if data.email.endswith('@edu.hse.ru') else 2 if data.email.endswith('@hse.ru') else 0
+    user_type = user_type_for_email(data.email)
 
-    session.add(User(
+    user = User(
         email=data.email,
-        password=get_password_hash(data.password),
+        password=await get_password_hash(data.password),
         name=data.name,
         active=True,
         email_verified=True,
         user_type=user_type
-    ))
+    )
+    session.add(user)
+    await session.delete(code_entry)
+    await session.flush()
 
-    session.delete(code_entry)
-    session.commit()
+    refresh_token = issue_refresh_token(session, user.id)
+    await session.commit()
 
     access_token = create_access_token(data={"sub": data.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 
 # ========================
 # СМЕНА ПАРОЛЯ (авторизованный)
 # ========================
 @router.post("/reset-password")
-def reset_password(
+async def reset_password(
         data: ResetPasswordRequest,
-        session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_user_async)
 ):
-    user = session.exec(select(User).where(User.email == current_user.email)).first()
+    # Если пользователь не из кэша, он уже в identity map этой сессии — запроса не будет
+    user = await session.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    if not verify_password(data.old_password, user.password):
+    if not await verify_password(data.old_password, user.password):
         raise HTTPException(status_code=400, detail="Неверный текущий пароль")
 
-    user.password = get_password_hash(data.new_password)
+    user.password = await get_password_hash(data.new_password)
     session.add(user)
-    session.commit()
+    await revoke_refresh_tokens(session, user.id)
+    await session.commit()
+    invalidate_user(user.email)
 
     return {"message": "Пароль успешно обновлён"}
 
@@ -307,21 +491,24 @@ def reset_password(
 # ПРОСТОЙ СБРОС ПАРОЛЯ
 # ========================
 @router.post("/reset-password-simple")
-def reset_password_simple(data: ResetPasswordSimpleRequest, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == data.email)).first()
+async def reset_password_simple(data: ResetPasswordSimpleRequest, session: AsyncSession = Depends(get_async_session)):
+    user = await get_user_by_email_async(session, data.email)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
     new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-    user.password = get_password_hash(new_password)
+    user.password = await get_password_hash(new_password)
     session.add(user)
-    session.commit()
+    await revoke_refresh_tokens(session, user.id)
+    # Письмо ставится в очередь в той же транзакции, что и смена пароля
+    send_temporary_password_email(data.email, new_password, session=session)
 
     try:
-        send_temporary_password_email(data.email, new_password)
+        await session.commit()
     except Exception as e:
         print(f"[email error] {e}")
         raise HTTPException(status_code=500, detail="Ошибка при отправке письма")
+    invalidate_user(data.email)
 
     return {"message": "Новый пароль отправлен на почту"}
 
@@ -330,38 +517,38 @@ def reset_password_simple(data: ResetPasswordSimpleRequest, session: Session = D
 # ВОССТАНОВЛЕНИЕ ПО КОДУ
 # ========================
 @router.post("/reset-password/send-code")
-def send_reset_code(email: EmailStr):
+def send_reset_code(email: EmailStr, session: Session = Depends(get_session)):
     code = ''.join(random.choices(string.digits, k=6))
 
-    with Session(engine) as session:
-        existing = session.exec(select(RegistrationCode).where(RegistrationCode.email == email)).first()
-        if existing:
-            existing.code = code
-        else:
-            session.add(RegistrationCode(email=email, code=code))
-        session.commit()
-
-    send_confirmation_email(email, code)
+    existing = session.exec(select(RegistrationCode).where(RegistrationCode.email == email)).first()
+    if existing:
+        existing.code = code
+    else:
+        session.add(RegistrationCode(email=email, code=code))
+    send_confirmation_email(email, code, session=session)
+    session.commit()
     return {"message": "Код отправлен на почту"}
 
 
 @router.post("/reset-password/confirm-code")
-def confirm_reset_code(data: ConfirmResetData):
-    with Session(engine) as session:
-        record = session.exec(select(RegistrationCode).where(RegistrationCode.email == data.email)).first()
+async def confirm_reset_code(data: ConfirmResetData, session: AsyncSession = Depends(get_async_session)):
+    record = (await session.exec(
+        select(RegistrationCode).where(RegistrationCode.email == data.email)
+    )).first()
 
-        if not record or record.code != data.code:
-            raise HTTPException(status_code=400, detail="Неверный код")
-
-        user = session.exec(select(User).where(User.email == data.email)).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if not record or record.code != data.code:
+        raise HTTPException(status_code=400, detail="Неверный код")
 
-        new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-        user.password = get_password_hash(new_password)
-        session.delete(record)
-        session.commit()
+    user = await get_user_by_email_async(session, data.email)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-        send_temporary_password_email(data.email, new_password)
+    new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    user.password = await get_password_hash(new_password)
+    await session.delete(record)
+    await revoke_refresh_tokens(session, user.id)
+    send_temporary_password_email(data.email, new_password, session=session)
+    await session.commit()
+    invalidate_user(data.email)
 
-        return {"message": "Новый пароль отправлен на почту"}
+    return {"message": "Новый пароль отправлен на почту"}
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+from fastapi import Request, Response
+
+# Клиент может хранить ответ, но обязан перепроверять его (If-None-Match) при каждом показе
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(names: Tuple[str, ...], versions: Tuple[int, ...]) -> str:
+    # Слабый ETag: тело может отличаться сжатием, но данные те же
+    tag = "-".join(f"{name}.{version}" for name, version in zip(names, versions))
+    return f'W/"{tag}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # Сравнение If-None-Match всегда слабое: W/"x" и "x" совпадают
+    return "*" in candidates or etag.removeprefix("W/") in (c.removeprefix("W/") for c in candidates)
+
+
+def _http_time(updated: datetime) -> datetime:
+    # В HTTP-датах только целые секунды: округляем вверх, чтобы Last-Modified был не раньше изменения
+    seconds = updated.replace(microsecond=0)
+    if updated.microsecond:
+        seconds += timedelta(seconds=1)
+    return seconds.replace(tzinfo=timezone.utc)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Дата из будущего недействительна (RFC 9110, 13.1.3) — иначе 304 получил бы клиент с неверными часами
+    return last_modified <= since <= datetime.now(timezone.utc)
+
+
+def conditional_response(
+        request: Request,
+        response: Response,
+        names: Tuple[str, ...],
+        versions: Tuple[int, ...],
+        updated: Optional[datetime],
+) -> Optional[Response]:
+    """
+    Выставляет ETag/Last-Modified/Cache-Control по счётчикам таблиц.
+    Если у клиента актуальная версия, возвращает готовый ответ 304 — его и нужно вернуть из эндпоинта.
+    """
+    headers = {"ETag": make_etag(names, versions), "Cache-Control": CACHE_CONTROL}
+    last_modified = _http_time(updated) if updated else None
+    # Пока секунда последнего изменения не закончилась, в неё может попасть ещё одно изменение
+    # с тем же Last-Modified — такой заголовок не отдаём, клиент перепроверит по ETag
+    if last_modified and last_modified <= datetime.now(timezone.utc):
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, headers["ETag"])
+    else:
+        # Пока Last-Modified не отдаётся, сравнивать с ним If-Modified-Since нельзя
+        fresh = bool(if_modified_since and "Last-Modified" in headers
+                     and _not_modified_since(if_modified_since, last_modified))
+
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
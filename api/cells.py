@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import Cell
-from database import get_session
+from database import get_async_session
+from api.caching import conditional_response
+from utils.table_versions import get_table_state_async
 
 router = APIRouter(prefix="/cells", tags=["Cells"])
 
 
 @router.get("/available")
-def get_available_cells(session: Session = Depends(get_session)):
-    return session.exec(select(Cell).where(Cell.is_free == True)).all()
+async def get_available_cells(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session)
+):
+    versions, updated = await get_table_state_async(session, "cell")
+    not_modified = conditional_response(request, response, ("cell",), versions, updated)
+    if not_modified:
+        return not_modified
+
+    return (await session.exec(select(Cell).where(Cell.is_free == True))).all()
@@ -1,14 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+import io
+import json
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request as HTTPRequest, Response, UploadFile
+from sqlalchemy import exists, func, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Session, select
-from models import Request, Item, ItemStatus, Cell
-from database import engine, get_session
-from api.auth import get_current_user
-from typing import List
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Request, Item, Cell, User
+from database import get_async_engine, get_session, get_async_session
+from api.auth import get_current_user_async
+from api.admin import require_admin
+from lookups import request_status, item_status
+from utils.table_versions import bump_versions, get_versions_async, get_table_state_async
+from api.caching import conditional_response
+from api.projections import parse_fields, projected_statement, project_rows
+from utils.item_search import tokenize, search_document, search_query, item_search_index
+from utils.cell_allocator import CELL_SIZES, CellTaken, NoFreeCell, allocate_cell, claim_specific_cell, release_cell
+from utils.item_import import detect_format, read_records, import_items
+from typing import List, Literal
 from pydantic import BaseModel
 from typing import Optional
 
 router = APIRouter(prefix="/items", tags=["Items"])
 
+# Снимок /items/available в памяти воркера. Пересобирается, только когда
+# меняются счётчики item/request (бронь, отмена, выдача, возврат, /items/broke и т.д.)
+AVAILABILITY_TABLES = ("item", "request")
+_available_snapshot = {"versions": None, "items": []}
+
+# Фильтры по характеристикам: /items/?specifications.resolution=4K
+SPEC_PARAM_PREFIX = "specifications."
+
 
 class ItemRead(BaseModel):
     id: int
@@ -17,41 +38,158 @@ class ItemRead(BaseModel):
     available: bool
     status: int
     specifications: Optional[dict]
+    size: Optional[str] = None
 
     class Config:
         orm_mode = True
 
 
-@router.get("/", response_model=List[Item])
-def get_all_items(current_user=Depends(get_current_user)):
-    with Session(engine) as session:
-        return session.exec(select(Item)).all()
+# Строка списка /items/: собирается из выбранных колонок, без ORM-объектов.
+# Поля, не попавшие в ?fields=..., в ответ не включаются
+class ItemListRead(BaseModel):
+    id: Optional[int] = None
+    inv_key: Optional[str] = None
+    name: Optional[str] = None
+    status: Optional[int] = None
+    owner: Optional[str] = None
+    available: Optional[bool] = None
+    access_level: Optional[int] = None
+    specifications: Optional[dict] = None
+    size: Optional[str] = None
+    cell: Optional[int] = None
+
+
+def _parse_spec_value(raw: str):
+    # "16" -> 16, "true" -> True, "4K" остаётся строкой
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def _spec_equals(key: str, value):
+    if get_async_engine().dialect.name == "postgresql":
+        # specifications @> {...} — идёт по GIN-индексу ix_item_specifications
+        return type_coerce(Item.specifications, JSONB).contains({key: value})
+
+    if isinstance(value, (dict, list)):
+        raise HTTPException(status_code=400, detail="Вложенные значения в фильтре поддерживаются только на Postgres")
+    field = Item.specifications[key]
+    if isinstance(value, bool):
+        return field.as_boolean() == value
+    if isinstance(value, int):
+        return field.as_integer() == value
+    if isinstance(value, float):
+        return field.as_float() == value
+    return field.as_string() == value
+
+
+def specification_filters(query_params, contains: Optional[str]) -> list:
+    conditions = []
+    for param, raw in query_params.multi_items():
+        if not param.startswith(SPEC_PARAM_PREFIX):
+            continue
+        key = param[len(SPEC_PARAM_PREFIX):]
+        if not key:
+            raise HTTPException(status_code=400, detail="Не указана характеристика в фильтре")
+        value = _parse_spec_value(raw)
+        # Значение из URL может быть и строкой "16", и числом 16 в JSON
+        if value == raw:
+            conditions.append(_spec_equals(key, raw))
+        else:
+            conditions.append(or_(_spec_equals(key, raw), _spec_equals(key, value)))
+
+    if contains is not None:
+        try:
+            expected = json.loads(contains)
+        except ValueError:
+            expected = None
+        if not isinstance(expected, dict):
+            raise HTTPException(status_code=400, detail="specifications_contains должен быть JSON-объектом")
+        if get_async_engine().dialect.name == "postgresql":
+            conditions.append(type_coerce(Item.specifications, JSONB).contains(expected))
+        else:
+            conditions.extend(_spec_equals(key, value) for key, value in expected.items())
+    return conditions
+
+
+@router.get("/", response_model=List[ItemListRead], response_model_exclude_unset=True)
+async def get_all_items(
+        request: HTTPRequest,
+        response: Response,
+        specifications_contains: Optional[str] = Query(None),
+        fields: Optional[str] = None,
+        session: AsyncSession = Depends(get_async_session),
+        current_user=Depends(get_current_user_async)
+):
+    names = parse_fields(ItemListRead, fields)
+    versions, updated = await get_table_state_async(session, "item")
+    not_modified = conditional_response(request, response, ("item",), versions, updated)
+    if not_modified:
+        return not_modified
+
+    statement = projected_statement(Item, names).where(*specification_filters(request.query_params, specifications_contains))
+    return project_rows((await session.exec(statement)).all(), names)
 
 
 @router.get("/available", response_model=List[Item])
-def get_available_items(
-        session: Session = Depends(get_session),
-        current_user=Depends(get_current_user)
+async def get_available_items(
+        request: HTTPRequest,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+        current_user=Depends(get_current_user_async)
 ):
-    free_status = session.exec(
-        select(ItemStatus).where(ItemStatus.name == "Свободен")
-    ).first()
-    if not free_status:
-        raise HTTPException(status_code=400, detail="Item status 'Свободен' not found")
+    versions, updated = await get_table_state_async(session, *AVAILABILITY_TABLES)
+    not_modified = conditional_response(request, response, AVAILABILITY_TABLES, versions, updated)
+    if not_modified:
+        return not_modified
 
-    active_item_ids = session.exec(
-        select(Request.item_id).where(Request.return_date.is_(None))
-    ).all()
+    if _available_snapshot["versions"] == versions:
+        return _available_snapshot["items"]
 
+    has_active_request = exists().where(Request.item_id == Item.id, Request.return_date.is_(None))
     statement = select(Item).where(
-        Item.status == free_status.id,
-        Item.available == True
+        Item.status == item_status.FREE,
+        Item.available == True,
+        ~has_active_request
     )
+    items = [item.model_dump() for item in (await session.exec(statement)).all()]
 
-    if active_item_ids:
-        statement = statement.where(Item.id.notin_(active_item_ids))
+    _available_snapshot["versions"] = versions
+    _available_snapshot["items"] = items
+    return items
 
-    return session.exec(statement).all()
+
+@router.get("/search", response_model=List[Item])
+async def search_items(
+        q: str = Query(..., min_length=1, max_length=200),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        session: AsyncSession = Depends(get_async_session),
+        current_user=Depends(get_current_user_async)
+):
+    tokens = tokenize(q)
+    if not tokens:
+        raise HTTPException(status_code=400, detail="Пустой поисковый запрос")
+
+    if get_async_engine().dialect.name == "postgresql":
+        document = search_document(Item)
+        query = search_query(tokens)
+        statement = (
+            select(Item)
+            .where(document.op("@@")(query))
+            .order_by(func.ts_rank(document, query).desc(), Item.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        return (await session.exec(statement)).all()
+
+    # Без полнотекстового поиска в БД — индекс в памяти, пересобирается при изменении item
+    (version,) = await get_versions_async(session, "item")
+    if item_search_index.version != version:
+        items = [item.model_dump() for item in (await session.exec(select(Item))).all()]
+        item_search_index.rebuild(version, items)
+    return item_search_index.search(tokens, limit, offset)
 
 
 class AdminBookingRequest(BaseModel):
@@ -59,6 +197,23 @@ class AdminBookingRequest(BaseModel):
     reason: str
 
 
+def claim_cell_for_item(db: Session, cell_id: Optional[int], size: Optional[str]) -> int:
+    """Занимает указанную ячейку или, если она не указана, наименьшую подходящую по размеру."""
+    if cell_id is None:
+        try:
+            return allocate_cell(db, size)
+        except NoFreeCell:
+            raise HTTPException(status_code=409, detail="Нет свободной ячейки подходящего размера")
+
+    if not db.get(Cell, cell_id):
+        raise HTTPException(status_code=404, detail="Ячейка не найдена")
+    try:
+        claim_specific_cell(db, cell_id)
+    except CellTaken:
+        raise HTTPException(status_code=400, detail="Ячейка уже занята")
+    return cell_id
+
+
 @router.post("/delete")
 def delete_item(data: dict, db: Session = Depends(get_session)):
     item_id = data.get("item_id")
@@ -67,7 +222,13 @@ def delete_item(data: dict, db: Session = Depends(get_session)):
     if not item:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
 
-    active_status_ids = [1, 3, 4, 5, 7]
+    active_status_ids = [
+        request_status.CREATED,
+        request_status.AWAITING_PICKUP,
+        request_status.ISSUED,
+        request_status.AWAITING_RETURN,
+        request_status.OVERDUE,
+    ]
 
     active_request = (
         db.query(Request)
@@ -79,11 +240,10 @@ def delete_item(data: dict, db: Session = Depends(get_session)):
         raise HTTPException(status_code=400, detail="Нельзя удалить: есть активная заявка")
 
     if item.cell:
-        cell = db.query(Cell).filter(Cell.id == item.cell).first()
-        if cell:
-            cell.is_free = True
+        release_cell(db, item.cell)
 
     db.delete(item)
+    bump_versions(db, "item", "cell")
     db.commit()
     return {"success": True}
 
@@ -98,16 +258,17 @@ def toggle_broken_item(data: dict, session: Session = Depends(get_session)):
     if not item:
         raise HTTPException(status_code=404, detail="Предмет не найден")
 
-    if item.status == 1:
-        item.status = 3
+    if item.status == item_status.FREE:
+        item.status = item_status.BROKEN
         item.available = False
-    elif item.status == 3:
-        item.status = 1
+    elif item.status == item_status.BROKEN:
+        item.status = item_status.FREE
         item.available = True
     else:
         raise HTTPException(status_code=400, detail="Нельзя изменить статус")
 
     session.add(item)
+    bump_versions(session, "item")
     session.commit()
 
     return {"message": "Статус обновлён", "status": item.status}
@@ -116,27 +277,21 @@ def toggle_broken_item(data: dict, session: Session = Depends(get_session)):
 @router.post("/change_cell")
 def change_cell(data: dict, db: Session = Depends(get_session)):
     item_id = data.get("item_id")
+    # Без cell_id ячейка подбирается автоматически по размеру предмета
     new_cell_id = data.get("cell_id")
 
-    item = db.query(Item).filter(Item.id == item_id).first()
-    new_cell = db.query(Cell).filter(Cell.id == new_cell_id).first()
-
-    if not item or not new_cell:
+    item = db.get(Item, item_id)
+    if not item:
         raise HTTPException(status_code=404, detail="Предмет или ячейка не найдены")
 
-    if not new_cell.is_free:
-        raise HTTPException(status_code=400, detail="Ячейка уже занята")
-
+    new_cell_id = claim_cell_for_item(db, new_cell_id, item.size)
     if item.cell:
-        old_cell = db.query(Cell).filter(Cell.id == item.cell).first()
-        if old_cell:
-            old_cell.is_free = True
-
+        release_cell(db, item.cell)
     item.cell = new_cell_id
-    new_cell.is_free = False
 
+    bump_versions(db, "item", "cell")
     db.commit()
-    return {"message": "Ячейка успешно обновлена"}
+    return {"message": "Ячейка успешно обновлена", "cell_id": new_cell_id}
 
 
 @router.post("/new")
@@ -146,28 +301,58 @@ def create_item(data: dict, db: Session = Depends(get_session)):
         if field not in data:
             raise HTTPException(status_code=400, detail=f"Отсутствует поле {field}")
 
+    if data.get("size") is not None and data["size"] not in CELL_SIZES:
+        raise HTTPException(status_code=400, detail="Размер должен быть одним из: S, M, L")
+
+    # allocate_cell=true — подобрать наименьшую свободную ячейку по размеру предмета
+    allocate = data.pop("allocate_cell", False)
     cell_id = data.get("cell")
-    if cell_id is not None:
-        cell = db.get(Cell, cell_id)
-        if not cell:
-            raise HTTPException(status_code=404, detail="Ячейка не найдена")
-        if not cell.is_free:
-            raise HTTPException(status_code=400, detail="Ячейка занята")
+    if cell_id is not None or allocate:
+        data["cell"] = claim_cell_for_item(db, cell_id, data.get("size"))
 
     new_item = Item(**data)
     db.add(new_item)
 
-    if cell_id is not None:
-        cell.is_free = False
-
+    bump_versions(db, "item", "cell")
     db.commit()
     db.refresh(new_item)
     return {"success": True, "item_id": new_item.id}
 
 
+@router.post("/import")
+def import_items_file(
+        file: UploadFile = File(...),
+        format: Optional[Literal["csv", "jsonl"]] = None,
+        db: Session = Depends(get_session),
+        current_user: User = Depends(require_admin)
+):
+    fmt = format or detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Укажите format=csv или format=jsonl")
+
+    # Файл читается построчно из временного файла загрузки, целиком в память не попадает
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = import_items(db, read_records(stream, fmt))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+    return report.as_dict()
+
+
 @router.get("/{item_id}", response_model=ItemRead)
-def get_item_by_id(item_id: int, db: Session = Depends(get_session)):
-    item = db.query(Item).filter(Item.id == item_id).first()
+async def get_item_by_id(
+        item_id: int,
+        request: HTTPRequest,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session)
+):
+    # Версия читается до строки: если между ними пройдёт запись, ETag окажется старее данных, а не наоборот
+    versions, updated = await get_table_state_async(session, "item")
+    item = await session.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
+
+    not_modified = conditional_response(request, response, ("item",), versions, updated)
+    if not_modified:
+        return not_modified
     return item
@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created: datetime, row_id: int) -> str:
+    raw = f"{created.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_raw, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_raw), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def keyset_page(statement, model, cursor: Optional[str], limit: Optional[int]):
+    """
+    Keyset-пагинация по (created, id) от новых к старым.
+    В отличие от OFFSET, глубокие страницы стоят столько же, сколько первая.
+    """
+    if cursor:
+        created, row_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(model.created, model.id) < tuple_(created, row_id))
+
+    statement = statement.order_by(model.created.desc(), model.id.desc())
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
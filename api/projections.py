@@ -0,0 +1,53 @@
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import select as sa_select
+from sqlmodel import select
+from models import Item, RequestStatus
+
+
+def request_list_statement(model, *columns):
+    """
+    Заявки (Request или ArchivedRequest) вместе с названием оборудования
+    и названием статуса одним запросом вместо session.get на каждую строку.
+
+    Возвращает строки с полями id, item_name, status_name и переданными columns.
+    """
+    return (
+        select(
+            model.id,
+            Item.name.label("item_name"),
+            RequestStatus.name.label("status_name"),
+            *columns,
+        )
+        .outerjoin(Item, Item.id == model.item_id)
+        .outerjoin(RequestStatus, RequestStatus.id == model.status)
+    )
+
+
+def parse_fields(schema, fields: Optional[str]) -> List[str]:
+    """
+    Разбирает параметр fields=id,name,... по полям схемы ответа.
+    Без параметра возвращаются все поля схемы.
+    """
+    if not fields:
+        return list(schema.model_fields)
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in schema.model_fields]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(unknown) or fields}")
+    return names
+
+
+def projected_statement(model, names: List[str], *required: str):
+    """
+    SELECT только нужных колонок вместо целых ORM-объектов.
+    required — колонки, нужные самому эндпоинту (например, для курсора), даже если их не просили.
+    """
+    columns = dict.fromkeys((*names, *required))
+    # select из SQLAlchemy: строки Row даже для одной колонки (select из sqlmodel вернул бы скаляры)
+    return sa_select(*(getattr(model, name) for name in columns))
+
+
+def project_rows(rows, names: List[str]) -> List[dict]:
+    return [{name: row._mapping[name] for name in names} for row in rows]
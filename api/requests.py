@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from models import Request, Item, RequestStatus, User
-from database import engine
-from api.auth import get_current_user, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Request, Item, User
+from database import engine, get_async_session
+from api.auth import get_current_user, get_current_user_async, get_session
+from api.projections import request_list_statement, parse_fields, projected_statement, project_rows
+from api.pagination import keyset_page, encode_cursor, CURSOR_HEADER
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from utils.generate_postamat_code import generate_postamat_code
+from utils.postamat_codes import postamat_codes
+from utils.table_versions import bump_versions
+from lookups import request_status, item_status, user_type
 from models import ArchivedRequest
 from utils.email_sender import send_admin_request_email, send_notification_email
-from typing import Optional
+from utils.email_outbox import enqueue_emails
+from typing import List, Literal, Optional, Tuple
 
 router = APIRouter(prefix="/requests", tags=["Requests"])
 
+CODE_GENERATION_ATTEMPTS = 5
+# Размер страницы /requests/all, если передан cursor без limit
+DEFAULT_PAGE_SIZE = 100
+# Максимум заявок в одном /update-status/batch
+BATCH_STATUS_LIMIT = 500
+
 
 class RequestCreate(BaseModel):
     item_id: int
@@ -25,6 +42,10 @@ class StatusUpdateData(BaseModel):
     reason: Optional[str] = None
 
 
+class BatchStatusUpdateData(BaseModel):
+    updates: List[StatusUpdateData] = Field(min_length=1, max_length=BATCH_STATUS_LIMIT)
+
+
 class ChangeReturnDateRequest(BaseModel):
     request_id: int
     new_date: datetime
@@ -35,98 +56,288 @@ class StatusUpdateRequest(BaseModel):
     new_status: int
 
 
+# Строка /requests/all: без кода постамата. Поля, не попавшие в ?fields=..., в ответ не включаются
+class RequestRead(BaseModel):
+    id: Optional[int] = None
+    status: Optional[int] = None
+    user: Optional[int] = None
+    issued_by: Optional[int] = None
+    comment: Optional[str] = None
+    created: Optional[datetime] = None
+    takendate: Optional[datetime] = None
+    planned_return_date: Optional[datetime] = None
+    return_date: Optional[datetime] = None
+    item_id: Optional[int] = None
+
+
 @router.post("/", response_model=dict)
-def create_request(data: RequestCreate, current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        item = session.get(Item, data.item_id)
-        if not item or not item.available:
-            raise HTTPException(status_code=400, detail="Оборудование недоступно")
-
-        status_name = "Ожидает получения" if item.access_level == 1 else "Создана"
-        status = session.exec(
-            select(RequestStatus).where(RequestStatus.name == status_name)
-        ).first()
-        if not status:
+def create_request(
+        data: RequestCreate,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    item = session.get(Item, data.item_id)
+    if not item or not item.available:
+        raise HTTPException(status_code=400, detail="Оборудование недоступно")
+
+    status_id = request_status.AWAITING_PICKUP if item.access_level == 1 else request_status.CREATED
+
+    if item.access_level == 1:
+        planned_return_date = datetime.utcnow().replace(
+            hour=18, minute=0, second=0, microsecond=0
+        ) + timedelta(days=3)
+    else:
+        if not data.planned_return_date:
             raise HTTPException(
-                status_code=400, detail=f"Не найден статус '{status_name}'"
-            )
-
-        if item.access_level == 1:
-            planned_return_date = datetime.utcnow().replace(
-                hour=18, minute=0, second=0, microsecond=0
-            ) + timedelta(days=3)
-        else:
-            if not data.planned_return_date:
-                raise HTTPException(
-                    status_code=400, detail="Укажите срок возврата"
-                )
-            planned_return_date = data.planned_return_date.replace(
-                hour=18, minute=0, second=0, microsecond=0
+                status_code=400, detail="Укажите срок возврата"
             )
-
-        item.status = 4
-        item.available = False
-
-        request = Request(
-            status=status.id,
-            user=current_user.id,
-            issued_by=current_user.id,
-            created=datetime.utcnow(),
-            comment=data.comment or "Автоматическое бронирование",
-            planned_return_date=planned_return_date,
-            item_id=data.item_id,
+        planned_return_date = data.planned_return_date.replace(
+            hour=18, minute=0, second=0, microsecond=0
         )
 
-        session.add(request)
-        session.add(item)
-        session.commit()
+    # Бронь — условный UPDATE: из одновременных заявок на один предмет пройдёт только одна,
+    # остальные сразу получат 409, не дожидаясь ничего, кроме блокировки строки
+    if not book_item(session, data.item_id):
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Оборудование уже забронировано")
+
+    request = Request(
+        status=status_id,
+        user=current_user.id,
+        issued_by=current_user.id,
+        created=datetime.utcnow(),
+        comment=data.comment or "Автоматическое бронирование",
+        planned_return_date=planned_return_date,
+        item_id=data.item_id,
+    )
 
-        if item.access_level != 1:
-            try:
-                send_admin_request_email(
-                    user_email=current_user.email,
-                    equipment_name=item.name,
-                    reason=data.comment,
-                )
-            except Exception as e:
-                print(f"[email error] Ошибка при отправке письма: {e}")
+    session.add(request)
+    bump_versions(session, "item", "request")
+
+    if item.access_level != 1:
+        # Письмо админу уходит в очередь в той же транзакции, что и заявка
+        send_admin_request_email(
+            user_email=current_user.email,
+            equipment_name=item.name,
+            reason=data.comment,
+            session=session,
+        )
+    session.commit()
 
-        return {"message": "Заявка успешно создана"}
+    return {"message": "Заявка успешно создана"}
 
 
 @router.get("/my")
-def get_my_requests(current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        requests = session.exec(
-            select(Request).where(Request.user == current_user.id).order_by(Request.created.desc())
-        ).all()
-
-        result = []
-        for req in requests:
-            item = session.get(Item, req.item_id)
-            status = session.get(RequestStatus, req.status)
-            result.append({
-                "id": req.id,
-                "item_name": item.name if item else "Оборудование",
-                "item_specs": item.specifications if item else "Характеристики недоступны",
-                "status": status.name if status else "Неизвестно",
-                "planned_return_date": req.planned_return_date.isoformat() if req.planned_return_date else None,
-            })
-        return result
-
-
-@router.get("/all")
-def get_all_requests(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    if current_user.user_type != 3:
+async def get_my_requests(
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_user_async)
+):
+    rows = (await session.exec(
+        request_list_statement(Request, Request.planned_return_date, Item.specifications.label("item_specs"))
+        .where(Request.user == current_user.id)
+        .order_by(Request.created.desc())
+    )).all()
+
+    return [
+        {
+            "id": row.id,
+            "item_name": row.item_name or "Оборудование",
+            "item_specs": row.item_specs if row.item_name is not None else "Характеристики недоступны",
+            "status": row.status_name or "Неизвестно",
+            "planned_return_date": row.planned_return_date.isoformat() if row.planned_return_date else None,
+        }
+        for row in rows
+    ]
+
+
+@router.get("/all", response_model=List[RequestRead], response_model_exclude_unset=True)
+def get_all_requests(
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=1000),
+        status: Optional[int] = None,
+        user_id: Optional[int] = None,
+        item_id: Optional[int] = None,
+        return_from: Optional[datetime] = None,
+        return_to: Optional[datetime] = None,
+        format: Literal["json", "ndjson"] = "json",
+        fields: Optional[str] = None,
+        current_user: User = Depends(get_current_user),
+        session: Session = Depends(get_session)
+):
+    if current_user.user_type != user_type.ADMIN:
         raise HTTPException(status_code=403, detail="Только для админа")
 
+    names = parse_fields(RequestRead, fields)
+    # created и id нужны для курсора, даже если их нет в fields
     statement = (
-        select(Request)
+        projected_statement(Request, names, "created", "id")
         .join(Item, Request.item_id == Item.id)
     )
-    requests = session.exec(statement).all()
+    if status is not None:
+        statement = statement.where(Request.status == status)
+    if user_id is not None:
+        statement = statement.where(Request.user == user_id)
+    if item_id is not None:
+        statement = statement.where(Request.item_id == item_id)
+    if return_from is not None:
+        statement = statement.where(Request.planned_return_date >= return_from)
+    if return_to is not None:
+        statement = statement.where(Request.planned_return_date <= return_to)
+
+    if format == "ndjson":
+        # Выгрузка целиком: строки читаются порциями и сразу отдаются клиенту
+        statement = keyset_page(statement, Request, cursor, None).execution_options(yield_per=500)
+
+        def stream():
+            # Своя сессия: сессия запроса закрывается раньше, чем клиент дочитает поток
+            with Session(engine) as export_session:
+                for row in export_session.exec(statement):
+                    yield orjson.dumps({name: row._mapping[name] for name in names}) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    # Без limit и cursor — все заявки одним ответом, как до пагинации; страницы включаются явно
+    if cursor and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    rows = session.exec(keyset_page(statement, Request, cursor, limit)).all()
+
+    if limit is not None and len(rows) == limit:
+        last = rows[-1]
+        response.headers[CURSOR_HEADER] = encode_cursor(last.created, last.id)
+
+    return project_rows(rows, names)
+
+
+def rejected_email(to_email: str, reason: Optional[str]):
+    body = (
+        f"Здравствуйте!\n\n"
+        f"Ваша заявка на бронирование оборудования была отклонена."
+    )
+    if reason:
+        body += f"\nПричина: {reason}"
+    body += (
+        "\n\nЕсли у вас возникли вопросы, просто ответьте на это письмо.\n\n"
+        "С уважением,\nКоманда SmartLocker HSE"
+    )
+    return to_email, "Заявка отклонена", body
+
+
+def approved_email(to_email: str):
+    return (
+        to_email,
+        "Заявка одобрена — оборудование готово к получению",
+        (
+            f"Здравствуйте!\n\n"
+            f"Ваша заявка на бронирование оборудования была одобрена.\n"
+            f"Вы можете забрать оборудование в течение ближайших 24 часов.\n\n"
+            f"Для получения используйте код из приложения и не забудьте ваш пропуск.\n\n"
+            f"Если возникнут вопросы, напишите нам ответом на это письмо.\n\n"
+            f"— Команда SmartLocker HSE"
+        ),
+    )
+
+
+class StatusChangeRejected(Exception):
+    """Смена статуса невозможна для текущего состояния заявки или предмета."""
+
+
+def allowed_transitions(status: int) -> Tuple[int, ...]:
+    # Какие статусы админ может выставить заявке в данном статусе
+    return {
+        request_status.CREATED: (request_status.AWAITING_PICKUP, request_status.REJECTED),
+        request_status.AWAITING_PICKUP: (request_status.ISSUED, request_status.REJECTED),
+        request_status.ISSUED: (request_status.AWAITING_RETURN, request_status.OVERDUE, request_status.RETURNED),
+        request_status.AWAITING_RETURN: (request_status.OVERDUE, request_status.RETURNED),
+        request_status.OVERDUE: (request_status.AWAITING_RETURN, request_status.RETURNED),
+    }.get(status, ())
+
+
+def item_holders(item_id: int, request_id: int, statuses: Tuple[int, ...]):
+    # Другие заявки на тот же предмет в указанных статусах
+    return select(Request.id).where(
+        Request.item_id == item_id, Request.id != request_id, Request.status.in_(statuses)
+    ).exists()
+
+
+def book_item(session: Session, item_id: int, request_id: Optional[int] = None) -> bool:
+    """
+    Бронирует предмет условным UPDATE: из одновременных попыток пройдёт только одна.
+    Новая заявка бронирует только свободный предмет. При одобрении заявки предмет уже забронирован
+    ею самой при создании, поэтому достаточно, чтобы его не держала другая одобренная или выданная заявка.
+    """
+    condition = Item.available == True
+    if request_id is not None:
+        holding = (
+            request_status.AWAITING_PICKUP, request_status.ISSUED,
+            request_status.AWAITING_RETURN, request_status.OVERDUE,
+        )
+        condition = condition | ~item_holders(item_id, request_id, holding)
+    booked = session.exec(
+        update(Item)
+        .where(Item.id == item_id, condition)
+        .values(available=False, status=item_status.BOOKED)
+    )
+    return booked.rowcount == 1
 
-    return requests
+
+def release_item(session: Session, item_id: int, request_id: int):
+    # Предмет освобождается, только если его не держит другая активная заявка (например, одобренная в том же пакете)
+    active = (
+        request_status.CREATED, request_status.AWAITING_PICKUP, request_status.ISSUED,
+        request_status.AWAITING_RETURN, request_status.OVERDUE,
+    )
+    session.exec(
+        update(Item)
+        .where(Item.id == item_id, ~item_holders(item_id, request_id, active))
+        .values(available=True, status=item_status.FREE)
+    )
+
+
+def apply_status_change(
+        session: Session,
+        request: Request,
+        user: Optional[User],
+        status: int,
+        reason: Optional[str],
+        enforce_transitions: bool = True,
+) -> Tuple[str, Optional[Tuple[str, str, str]]]:
+    """
+    Меняет статус заявки в транзакции сессии (коммит — за вызывающим кодом).
+    Отклонение переносит заявку в архив и освобождает ещё не выданный предмет, одобрение (AWAITING_PICKUP) бронирует его.
+    Переход не из allowed_transitions (если enforce_transitions) или занятый предмет — StatusChangeRejected,
+    заявка при этом не меняется.
+    Возвращает сообщение и письмо для пользователя (to_email, subject, body) или None.
+    """
+    if enforce_transitions and status not in allowed_transitions(request.status):
+        current = request_status.name_of(request.status) or request.status
+        raise StatusChangeRejected(f"Недопустимая смена статуса заявки «{current}»")
+
+    email = user.email if user and user.email else None
+
+    if status == request_status.REJECTED:
+        session.add(ArchivedRequest(
+            user=request.user,
+            item_id=request.item_id,
+            created=request.created,
+            planned_return_date=request.planned_return_date,
+            comment=request.comment,
+            status=request_status.REJECTED
+        ))
+        session.delete(request)
+        # Предмет освобождается, только если он ещё в постамате: выданный остаётся у пользователя
+        if request.status in (request_status.CREATED, request_status.AWAITING_PICKUP):
+            release_item(session, request.item_id, request.id)
+        return "Заявка отклонена и перенесена в архив", rejected_email(email, reason) if email else None
+
+    if status == request_status.AWAITING_PICKUP and not book_item(session, request.item_id, request.id):
+        raise StatusChangeRejected("Оборудование уже забронировано другой заявкой")
+
+    request.status = status
+    session.add(request)
+    if status == request_status.AWAITING_PICKUP:
+        return "Статус заявки обновлён", approved_email(email) if email else None
+    return "Статус заявки обновлён", None
 
 
 @router.post("/update-status")
@@ -135,80 +346,90 @@ def update_request_status(
         session: Session = Depends(get_session),
         current_user: User = Depends(get_current_user)
 ):
-    if current_user.user_type != 3:
+    if current_user.user_type != user_type.ADMIN:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    request = session.exec(select(Request).where(Request.id == data.request_id)).first()
+    # Блокировка строки: выдача или отмена не пройдут посреди смены статуса
+    request = session.get(Request, data.request_id, with_for_update=True)
     if not request:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
 
-    user = session.exec(select(User).where(User.id == request.user)).first()
-    item = session.get(Item, request.item_id)
+    user = session.get(User, request.user)
 
-    if data.status == 2:
-        archived = ArchivedRequest(
-            user=request.user,
-            item_id=request.item_id,
-            created=request.created,
-            planned_return_date=request.planned_return_date,
-            actual_return_date=None,
-            comment=request.comment,
-            status=2
+    # Одиночный эндпоинт — ручная правка: админ может выставить любой статус,
+    # таблица переходов действует только для пакета
+    try:
+        message, email = apply_status_change(
+            session, request, user, data.status, data.reason, enforce_transitions=False
         )
-        session.add(archived)
-        session.delete(request)
-        session.commit()
+    except StatusChangeRejected as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if email:
+        enqueue_emails(session, [email])
+    bump_versions(session, "request", "item")
+    session.commit()
+    if data.status == request_status.REJECTED:
+        postamat_codes.discard_request(data.request_id)
 
-        if user and user.email:
-            try:
-                body = (
-                    f"Здравствуйте!\n\n"
-                    f"Ваша заявка на бронирование оборудования была отклонена."
-                )
-                if data.reason:
-                    body += f"\nПричина: {data.reason}"
-                body += (
-                    "\n\nЕсли у вас возникли вопросы, просто ответьте на это письмо.\n\n"
-                    "С уважением,\nКоманда SmartLocker HSE"
-                )
-                send_notification_email(
-                    to_email=user.email,
-                    subject="Заявка отклонена",
-                    body=body
-                )
-            except Exception as e:
-                print(f"[Ошибка при отправке письма] {e}")
-
-        return {"message": "Заявка отклонена и перенесена в архив"}
-
-    request.status = data.status
-
-    if data.status == 3 and item:
-        item.status = 4
-        item.available = False
-        session.add(item)
+    return {"message": message}
 
-    session.add(request)
-    session.commit()
 
-    if user and user.email and data.status == 3:
+@router.post("/update-status/batch")
+def update_request_status_batch(
+        data: BatchStatusUpdateData,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    if current_user.user_type != user_type.ADMIN:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+
+    # Заявки блокируются в порядке id, чтобы параллельные пакеты не взаимоблокировались,
+    # а выдача и отмена не прошли посреди пакета; пользователи — вторым запросом
+    request_ids = {change.request_id for change in data.updates}
+    requests = {
+        r.id: r
+        for r in session.exec(
+            select(Request).where(Request.id.in_(request_ids)).order_by(Request.id).with_for_update()
+        ).all()
+    }
+    user_ids = {r.user for r in requests.values()}
+    users = {u.id: u for u in session.exec(select(User).where(User.id.in_(user_ids))).all()} if user_ids else {}
+
+    results = []
+    emails = []
+    rejected_ids = []
+    processed = set()
+    for change in data.updates:
+        if change.request_id in processed:
+            results.append({"request_id": change.request_id, "success": False, "detail": "Заявка уже есть в пакете"})
+            continue
+        request = requests.get(change.request_id)
+        if request is None:
+            results.append({"request_id": change.request_id, "success": False, "detail": "Заявка не найдена"})
+            continue
+        processed.add(change.request_id)
+
         try:
-            send_notification_email(
-                to_email=user.email,
-                subject="Заявка одобрена — оборудование готово к получению",
-                body=(
-                    f"Здравствуйте!\n\n"
-                    f"Ваша заявка на бронирование оборудования была одобрена.\n"
-                    f"Вы можете забрать оборудование в течение ближайших 24 часов.\n\n"
-                    f"Для получения используйте код из приложения и не забудьте ваш пропуск.\n\n"
-                    f"Если возникнут вопросы, напишите нам ответом на это письмо.\n\n"
-                    f"— Команда SmartLocker HSE"
-                )
+            message, email = apply_status_change(
+                session, request, users.get(request.user), change.status, change.reason
             )
-        except Exception as e:
-            print(f"[Ошибка при отправке письма] {e}")
+        except StatusChangeRejected as e:
+            results.append({"request_id": change.request_id, "success": False, "detail": str(e)})
+            continue
+        if email:
+            emails.append(email)
+        if change.status == request_status.REJECTED:
+            rejected_ids.append(request.id)
+        results.append({"request_id": change.request_id, "success": True, "detail": message})
+
+    # Все изменения и письма — одной транзакцией
+    enqueue_emails(session, emails)
+    bump_versions(session, "request", "item")
+    session.commit()
+    for request_id in rejected_ids:
+        postamat_codes.discard_request(request_id)
 
-    return {"message": "Статус заявки обновлён"}
+    return {"results": results}
 
 
 @router.post("/auto_update_status")
@@ -221,81 +442,93 @@ def auto_update_status(data: StatusUpdateRequest, db: Session = Depends(get_sess
         raise HTTPException(status_code=404, detail="Заявка не найдена")
 
     request.status = new_status
+    bump_versions(db, "request")
     db.commit()
     return {"message": "Статус обновлён автоматически"}
 
 
 @router.post("/{request_id}/generate-code")
-def generate_code(request_id: int, current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        request = session.get(Request, request_id)
-        if not request:
-            raise HTTPException(status_code=404, detail="Request not found")
-        if request.user != current_user.id:
-            raise HTTPException(status_code=403, detail="Forbidden")
+def generate_code(
+        request_id: int,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    request = session.get(Request, request_id)
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if request.user != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
 
+    # Код уникален среди активных заявок (uq_request_postamat_code);
+    # при редком совпадении просто генерируем новый
+    for _ in range(CODE_GENERATION_ATTEMPTS):
         code, expiry = generate_postamat_code()
         request.postamat_code = code
         request.code_expiry = expiry
         session.add(request)
-        session.commit()
-        return {"code": code, "expires_at": expiry}
+        # Код постамата не попадает в кэшируемые списки, версию "request" не трогаем
+        try:
+            session.commit()
+            postamat_codes.put(code, request_id, expiry)
+            return {"code": code, "expires_at": expiry}
+        except IntegrityError:
+            session.rollback()
 
+    raise HTTPException(status_code=503, detail="Не удалось сгенерировать код, попробуйте ещё раз")
 
-@router.post("/{request_id}/cancel", response_model=dict)
-def cancel_request(request_id: int, current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        request = session.get(Request, request_id)
-        if not request or request.user != current_user.id:
-            raise HTTPException(status_code=403, detail="Недоступно")
-
-        item = session.get(Item, request.item_id)
-        if item:
-            item.available = True
-            item.status = 1
-            session.add(item)
 
-        status = session.exec(
-            select(RequestStatus).where(RequestStatus.name == 'Отменена')
-        ).first()
+@router.post("/{request_id}/cancel", response_model=dict)
+def cancel_request(
+        request_id: int,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    request = session.get(Request, request_id)
+    if not request or request.user != current_user.id:
+        raise HTTPException(status_code=403, detail="Недоступно")
 
-        if not status:
-            raise HTTPException(status_code=400, detail="Не найден статус 'Отменена'")
+    item = session.get(Item, request.item_id)
+    if item:
+        item.available = True
+        item.status = item_status.FREE
+        session.add(item)
 
-        request.status = status.id
-        session.commit()
+    request.status = request_status.CANCELLED
+    session.commit()
 
-        archived = ArchivedRequest.from_orm(request)
-        session.add(archived)
+    archived = ArchivedRequest.from_orm(request)
+    session.add(archived)
 
-        session.delete(request)
-        session.commit()
+    session.delete(request)
+    bump_versions(session, "item", "request")
+    session.commit()
+    postamat_codes.discard_request(request_id)
 
-        return {"message": "Заявка отменена и перенесена в архив"}
+    return {"message": "Заявка отменена и перенесена в архив"}
 
 
 @router.get("/history")
-def get_archived_requests(current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        requests = session.exec(
-            select(ArchivedRequest)
-            .where(ArchivedRequest.user == current_user.id)
-            .order_by(ArchivedRequest.created.desc())
-        ).all()
-
-        result = []
-        for req in requests:
-            item = session.get(Item, req.item_id)
-            status = session.get(RequestStatus, req.status)
-            result.append({
-                "id": req.id,
-                "item_name": item.name if item else "Оборудование",
-                "status": status.name if status else "Неизвестно",
-                "created": req.created.strftime('%Y-%m-%d %H:%M'),
-                "planned_return_date": req.planned_return_date.strftime(
-                    '%Y-%m-%d') if req.planned_return_date else None,
-            })
-        return result
+async def get_archived_requests(
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_user_async)
+):
+    rows = (await session.exec(
+        request_list_statement(ArchivedRequest, ArchivedRequest.created, ArchivedRequest.planned_return_date)
+        .where(ArchivedRequest.user == current_user.id)
+        .order_by(ArchivedRequest.created.desc())
+    )).all()
+
+    return [
+        {
+            "id": row.id,
+            "item_name": row.item_name or "Оборудование",
+            "status": row.status_name or "Неизвестно",
+            "created": row.created.strftime('%Y-%m-%d %H:%M'),
+            "planned_return_date": row.planned_return_date.strftime(
+                '%Y-%m-%d') if row.planned_return_date else None,
+        }
+        for row in rows
+    ]
 
 
 @router.post("/change_return_date")
@@ -304,7 +537,7 @@ def change_return_date(
         session: Session = Depends(get_session),
         current_user: User = Depends(get_current_user)
 ):
-    if current_user.user_type != 3:
+    if current_user.user_type != user_type.ADMIN:
         raise HTTPException(status_code=403, detail="Только администраторы могут изменять сроки возврата")
 
     request = session.exec(select(Request).where(Request.id == data.request_id)).first()
@@ -318,25 +551,24 @@ def change_return_date(
 
     request.planned_return_date = data.new_date.replace(hour=18, minute=0, second=0, microsecond=0)
     session.add(request)
-    session.commit()
+    bump_versions(session, "request")
 
     if user.email:
-        try:
-            formatted_date = request.planned_return_date.strftime("%d.%m.%Y")
-            body = (
-                f"Здравствуйте, {user.name or 'пользователь'}!\n\n"
-                f"Срок возврата оборудования \"{item.name}\" по вашей заявке был изменён администратором.\n\n"
-                f"Новая дата возврата: {formatted_date} до 21:00.\n\n"
-                f"Если у вас возникнут вопросы, пожалуйста, свяжитесь с нами, ответив на это письмо.\n\n"
-                f"С уважением,\nКоманда SmartLocker HSE"
-            )
-            send_notification_email(
-                to_email=user.email,
-                subject="Изменение срока возврата оборудования",
-                body=body,
-            )
-        except Exception as e:
-            print(f"[Ошибка при отправке письма] {e}")
+        formatted_date = request.planned_return_date.strftime("%d.%m.%Y")
+        body = (
+            f"Здравствуйте, {user.name or 'пользователь'}!\n\n"
+            f"Срок возврата оборудования \"{item.name}\" по вашей заявке был изменён администратором.\n\n"
+            f"Новая дата возврата: {formatted_date} до 21:00.\n\n"
+            f"Если у вас возникнут вопросы, пожалуйста, свяжитесь с нами, ответив на это письмо.\n\n"
+            f"С уважением,\nКоманда SmartLocker HSE"
+        )
+        send_notification_email(
+            to_email=user.email,
+            subject="Изменение срока возврата оборудования",
+            body=body,
+            session=session,
+        )
+    session.commit()
 
     return {"message": "Срок возврата обновлён и письмо отправлено"}
 
@@ -355,10 +587,10 @@ def request_return_date_change(
     if not item:
         raise HTTPException(status_code=404, detail="Оборудование не найдено")
 
-    user_type = {
-        1: "студент",
-        2: "сотрудник",
-        3: "администратор",
+    user_type_name = {
+        user_type.STUDENT: "студент",
+        user_type.STAFF: "сотрудник",
+        user_type.ADMIN: "администратор",
     }.get(current_user.user_type, "пользователь")
 
     new_date_str = data.new_date.strftime("%d.%m.%Y")
@@ -369,7 +601,7 @@ def request_return_date_change(
     body = (
         f"Поступил запрос на продление:\n"
         f"Заявка №{request.id} на оборудование \"{item.name}\".\n"
-        f"{user_type.title()} {current_user.name} ({current_user.email}) запрашивает продление до {new_date_str}.\n\n"
+        f"{user_type_name.title()} {current_user.name} ({current_user.email}) запрашивает продление до {new_date_str}.\n\n"
         f"Заявка создана: {created_str}\n"
         f"Текущая дата возврата: {current_return_str}\n\n"
         f"Пожалуйста, подтвердите или отклоните продление в админ-панели приложения."
@@ -380,7 +612,9 @@ def request_return_date_change(
             to_email="noreply-smartlocker@yandex.ru",
             subject=subject,
             body=body,
+            session=session,
         )
+        session.commit()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при отправке письма: {str(e)}")
 
@@ -392,9 +626,25 @@ class PostamatActionRequest(BaseModel):
     card_id: str
 
 
+def find_request_by_code(session: Session, code: str) -> Optional[Request]:
+    # Сначала индекс в памяти (поиск по первичному ключу), затем БД
+    request_id = postamat_codes.get(code)
+    if request_id is not None:
+        request = session.get(Request, request_id)
+        if request and request.postamat_code == code:
+            return request
+        # Код уже перевыпущен или заявка закрыта в другом воркере
+        postamat_codes.discard(code)
+
+    request = session.exec(select(Request).where(Request.postamat_code == code)).first()
+    if request:
+        postamat_codes.put(code, request.id, request.code_expiry)
+    return request
+
+
 @router.post("/pickup")
 def pickup_equipment(code: str, card_id: str, session: Session = Depends(get_session)):
-    request = session.exec(select(Request).where(Request.postamat_code == code)).first()
+    request = find_request_by_code(session, code)
     if not request:
         raise HTTPException(status_code=404, detail="Заявка по коду не найдена")
 
@@ -405,22 +655,27 @@ def pickup_equipment(code: str, card_id: str, session: Session = Depends(get_ses
     if not user or user.card_id != card_id:
         raise HTTPException(status_code=403, detail="Пропуск не соответствует пользователю")
 
-    request.status = 4
+    request.status = request_status.ISSUED
+    # Код одноразовый: освобождаем его, для возврата пользователь сгенерирует новый
+    request.postamat_code = None
+    request.code_expiry = None
     session.add(request)
 
     item = session.get(Item, request.item_id)
     if item:
-        item.status = 2
+        item.status = item_status.ISSUED
         item.available = False
         session.add(item)
 
+    bump_versions(session, "request", "item")
     session.commit()
+    postamat_codes.discard(code)
     return {"message": "Оборудование успешно выдано"}
 
 
 @router.post("/return")
 def return_equipment(code: str, card_id: str, session: Session = Depends(get_session)):
-    request = session.exec(select(Request).where(Request.postamat_code == code)).first()
+    request = find_request_by_code(session, code)
     if not request:
         raise HTTPException(status_code=404, detail="Заявка по коду не найдена")
 
@@ -432,17 +687,19 @@ def return_equipment(code: str, card_id: str, session: Session = Depends(get_ses
         raise HTTPException(status_code=403, detail="Пропуск не соответствует пользователю")
 
     archived = ArchivedRequest.from_orm(request)
-    archived.status = 6
+    archived.status = request_status.RETURNED
     archived.return_date = datetime.utcnow()
     session.add(archived)
 
     item = session.get(Item, request.item_id)
     if item:
-        item.status = 1
+        item.status = item_status.FREE
         item.available = True
         session.add(item)
 
     session.delete(request)
+    bump_versions(session, "request", "item")
     session.commit()
+    postamat_codes.discard(code)
 
     return {"message": "Оборудование успешно возвращено"}
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
+from sqlmodel import Session
 from api.auth import get_current_user
+from database import get_session
 from models import User
 from utils.email_sender import send_support_message
 from pydantic import BaseModel, EmailStr
@@ -15,6 +17,7 @@ router = APIRouter(prefix="/support", tags=["Support"])
 @router.post("", response_model=dict)
 def send_support_request(
         support_data: SupportRequest,
+        session: Session = Depends(get_session),
         current_user: User = Depends(get_current_user)
 ):
     message = support_data.message
@@ -23,7 +26,8 @@ def send_support_request(
     print(f"[support] Получено обращение от {user_email}: {message}")
 
     try:
-        send_support_message(user_email, message)
+        send_support_message(user_email, message, session=session)
+        session.commit()
         return {"message": "Обращение успешно отправлено"}
     except Exception as e:
         print(f"[support error] {e}")
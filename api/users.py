@@ -1,17 +1,40 @@
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from sqlmodel import Session, select
 from models import User, Request
-from database import engine
-from api.auth import get_current_user
+from database import get_session
+from api.auth import get_current_user, invalidate_user
+from api.projections import parse_fields, projected_statement, project_rows
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
-@router.get("/")
-def get_users(current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        users = session.exec(select(User)).all()
-        return users
+# Публичные поля пользователя: без хеша пароля.
+# Поля, не попавшие в ?fields=..., в ответ не включаются
+class UserRead(BaseModel):
+    id: Optional[int] = None
+    active: Optional[bool] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    created: Optional[datetime] = None
+    card_id: Optional[str] = None
+    user_type: Optional[int] = None
+    email_verified: Optional[bool] = None
+    telegram_id: Optional[int] = None
+
+
+@router.get("/", response_model=List[UserRead], response_model_exclude_unset=True)
+def get_users(
+        fields: Optional[str] = None,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    names = parse_fields(UserRead, fields)
+    rows = session.exec(projected_statement(User, names)).all()
+    return project_rows(rows, names)
 
 
 @router.get("/me")
@@ -26,29 +49,34 @@ def get_me(current_user: User = Depends(get_current_user)):
     }
 
 
-@router.get("/{user_id}")
-def get_user_by_id(user_id: int, current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        user = session.get(User, user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user
+@router.get("/{user_id}", response_model=UserRead, response_model_exclude_unset=True)
+def get_user_by_id(
+        user_id: int,
+        fields: Optional[str] = None,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    names = parse_fields(UserRead, fields)
+    row = session.exec(projected_statement(User, names).where(User.id == user_id)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    return project_rows([row], names)[0]
 
 
 @router.delete("/delete")
-def delete_user(current_user: User = Depends(get_current_user)):
-    with Session(engine) as session:
-        active_requests = session.exec(
-            select(Request).where(Request.user == current_user.id)
-        ).all()
-        if active_requests:
-            raise HTTPException(
-                status_code=400,
-                detail="Невозможно удалить аккаунт — у вас есть активные заявки.",
-            )
-
-        user = session.get(User, current_user.id)
-        if user:
-            session.delete(user)
-            session.commit()
-        return {"message": "Аккаунт удален"}
+def delete_user(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+    active_requests = session.exec(
+        select(Request).where(Request.user == current_user.id)
+    ).all()
+    if active_requests:
+        raise HTTPException(
+            status_code=400,
+            detail="Невозможно удалить аккаунт — у вас есть активные заявки.",
+        )
+
+    user = session.get(User, current_user.id)
+    if user:
+        session.delete(user)
+        session.commit()
+    invalidate_user(current_user.email)
+    return {"message": "Аккаунт удален"}
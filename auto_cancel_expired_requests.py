@@ -1,113 +1,137 @@
+import argparse
 import os
+import sys
 from datetime import datetime, timedelta
-import requests
 from dotenv import load_dotenv
-from utils.email_sender import send_notification_email
 
 load_dotenv()
 
-BASE_URL = "https://hsesmartlocker.ru"
-ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
-ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import delete, func, insert, literal, update
+from sqlmodel import Session, select
+from database import engine
+from models import Request, ArchivedRequest, Item, User
+from utils.email_outbox import enqueue_emails
+from lookups import request_status, item_status
+from utils.table_versions import bump_versions
 
-
-def login_admin():
-    res = requests.post(
-        f"{BASE_URL}/auth/token",
-        data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-    )
-    if res.status_code == 200:
-        return res.json().get("access_token")
-    print("[ERROR] Авторизация не удалась:", res.text)
-    return None
+EXPIRY = timedelta(hours=48)
+REPORT_LIMIT = 20
 
 
-def get_all_requests(token):
-    res = requests.get(
-        f"{BASE_URL}/requests/all",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    return res.json() if res.status_code == 200 else []
+def expired_condition(cutoff: datetime):
+    return (Request.status == request_status.CREATED) & (Request.created < cutoff)
 
 
-def get_user_email(user_id, token):
-    res = requests.get(
-        f"{BASE_URL}/users/{user_id}",
-        headers={"Authorization": f"Bearer {token}"}
+def cancelled_email(email: str, item_name: str):
+    return (
+        email,
+        "Ваша заявка отменена",
+        f"Здравствуйте!\n\n"
+        f"Ваша заявка на оборудование «{item_name}» была автоматически отменена, "
+        f"так как вы не забрали его в течение 48 часов.\n\n"
+        f"Вы можете оформить новую заявку в приложении SmartLocker.\n\n"
+        f"С уважением,\nКоманда SmartLocker HSE"
     )
-    return res.json().get("email") if res.status_code == 200 else None
 
 
-def get_item_name(item_id, token):
-    res = requests.get(
-        f"{BASE_URL}/items/{item_id}",
-        headers={"Authorization": f"Bearer {token}"}
+def report(session: Session, cutoff: datetime):
+    condition = expired_condition(cutoff)
+    total = session.exec(select(func.count()).select_from(Request).where(condition)).one()
+    print(f"[DRY RUN] Будет отменено заявок: {total}")
+
+    sample = session.exec(
+        select(Request.id, Request.created, User.email, Item.name)
+        .outerjoin(User, User.id == Request.user)
+        .outerjoin(Item, Item.id == Request.item_id)
+        .where(condition)
+        .order_by(Request.created)
+        .limit(REPORT_LIMIT)
+    ).all()
+    for row in sample:
+        print(f"  #{row.id} от {row.created:%Y-%m-%d %H:%M} — {row.email} — {row.name}")
+    if total > len(sample):
+        print(f"  ... и ещё {total - len(sample)}")
+
+
+def sweep(session: Session, cutoff: datetime) -> int:
+    condition = expired_condition(cutoff)
+
+    # Блокируем отобранные заявки, чтобы админ не одобрил их посреди транзакции
+    notifications = session.exec(
+        select(User.email, Item.name)
+        .select_from(Request)
+        .join(User, User.id == Request.user)
+        .outerjoin(Item, Item.id == Request.item_id)
+        .where(condition, User.email.is_not(None))
+        .with_for_update(of=Request)
+    ).all()
+
+    archived_columns = [
+        "status", "user", "issued_by", "comment", "created", "takendate",
+        "planned_return_date", "return_date", "item_id", "postamat_code", "code_expiry",
+    ]
+    session.exec(
+        insert(ArchivedRequest).from_select(
+            archived_columns,
+            select(
+                literal(request_status.REJECTED), Request.user, Request.issued_by, Request.comment, Request.created,
+                Request.takendate, Request.planned_return_date, Request.return_date, Request.item_id,
+                Request.postamat_code, Request.code_expiry,
+            ).where(condition),
+        )
     )
-    return res.json().get("name", "Оборудование") if res.status_code == 200 else "Оборудование"
-
-
-def cancel_request(request_id, token):
-    res = requests.post(
-        f"{BASE_URL}/requests/update-status",
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "request_id": request_id,
-            "status": 2,
-            "reason": "Не был получен в течение 48 часов",
-        }
+
+    session.exec(
+        update(Item)
+        .where(Item.id.in_(select(Request.item_id).where(condition)))
+        .values(available=True, status=item_status.FREE)
+        .execution_options(synchronize_session=False)
     )
-    return res.status_code == 200
+
+    cancelled = session.exec(
+        delete(Request).where(condition).execution_options(synchronize_session=False)
+    ).rowcount
+
+    enqueue_emails(session, [cancelled_email(row.email, row.name or "Оборудование") for row in notifications])
+
+    if cancelled:
+        bump_versions(session, "request", "item")
+    session.commit()
+    return cancelled
+
+
+def release_expired_codes(session: Session, now: datetime) -> int:
+    # Истёкшие коды постамата больше не принимаются; освобождаем их, чтобы они
+    # не занимали место в уникальном индексе uq_request_postamat_code
+    released = session.exec(
+        update(Request)
+        .where(Request.code_expiry < now)
+        .values(postamat_code=None, code_expiry=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    session.commit()
+    return released
 
 
 def main():
-    token = login_admin()
-    if not token:
-        return
-
-    now = datetime.utcnow()
-
-    for req in get_all_requests(token):
-        if req.get("status") != 1:
-            continue
-
-        created_at = req.get("created")
-        if not created_at:
-            continue
-
-        try:
-            created_dt = datetime.fromisoformat(created_at)
-        except Exception as e:
-            print(f"[ERROR] Невозможно разобрать дату: {created_at} — {e}")
-            continue
-
-        if now - created_dt > timedelta(hours=48):
-            req_id = req["id"]
-            user_id = req["user"]
-            item_id = req["item_id"]
-
-            if cancel_request(req_id, token):
-                email = get_user_email(user_id, token)
-                item_name = get_item_name(item_id, token)
-                if email:
-                    send_notification_email(
-                        email,
-                        subject="Ваша заявка отменена",
-                        body=(
-                            f"Здравствуйте!\n\n"
-                            f"Ваша заявка на оборудование «{item_name}» была автоматически отменена, "
-                            f"так как вы не забрали его в течение 48 часов.\n\n"
-                            f"Вы можете оформить новую заявку в приложении SmartLocker.\n\n"
-                            f"С уважением,\nКоманда SmartLocker HSE"
-                        )
-                    )
-                    print(f"[OK] Заявка {req_id} отменена и письмо отправлено")
-                else:
-                    print(f"[WARN] Не удалось найти email для пользователя {user_id}")
+    parser = argparse.ArgumentParser(description="Отмена заявок, не полученных в течение 48 часов")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, какие заявки будут отменены")
+    args = parser.parse_args()
+
+    cutoff = datetime.utcnow() - EXPIRY
+
+    with Session(engine) as session:
+        if args.dry_run:
+            report(session, cutoff)
+            return
+
+        cancelled = sweep(session, cutoff)
+        print(f"[OK] Отменено заявок: {cancelled}")
+
+        released = release_expired_codes(session, datetime.utcnow())
+        print(f"[OK] Освобождено истёкших кодов постамата: {released}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,12 +1,133 @@
+import threading
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, echo=True)
+
+# Настройки подключения (см. раздел «База данных» в README)
+DEBUG = os.getenv("DEBUG", "0") == "1"
+SQL_ECHO = os.getenv("SQL_ECHO", "1" if DEBUG else "0") == "1"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class PoolCounters:
+    """Примесь к QueuePool: дополнительно считает ожидающих соединение и таймауты."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counter_lock = threading.Lock()
+        self.waiting = 0
+        self.timeouts = 0
+
+    def _do_get(self):
+        with self._counter_lock:
+            self.waiting += 1
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._counter_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._counter_lock:
+                self.waiting -= 1
+
+
+class InstrumentedQueuePool(PoolCounters, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(PoolCounters, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    options = {"echo": SQL_ECHO}
+    if url.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    options["poolclass"] = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def async_database_url(url: str) -> str:
+    # postgresql:// -> postgresql+asyncpg://, sqlite:// -> sqlite+aiosqlite://
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}.get(backend)
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine():
+    # Создаётся при первом обращении: скриптам cron (check_returns.py, email_worker.py)
+    # async-драйвер не нужен, они работают только через engine
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True)
+                )
+    return _async_engine
+
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    # expire_on_commit=False: после commit атрибуты не должны подгружаться неявным IO
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def pool_status(pool=None) -> dict:
+    pool = pool or engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    if isinstance(pool, PoolCounters):
+        status.update(waiting=pool.waiting, timeouts=pool.timeouts)
+    return status
@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlmodel import Session, select
+from database import engine
+from models import EmailOutbox
+from utils.email_outbox import mark_sent, mark_failed
+from utils.email_sender import deliver_batch
+
+BATCH_SIZE = 20
+POLL_INTERVAL_SECONDS = 5
+
+
+def fetch_due_messages(session: Session, limit: int):
+    # SKIP LOCKED позволяет запускать несколько воркеров без двойной отправки
+    statement = (
+        select(EmailOutbox)
+        .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= datetime.utcnow())
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return session.exec(statement).all()
+
+
+def process_batch(limit: int = BATCH_SIZE) -> int:
+    with Session(engine) as session:
+        messages = fetch_due_messages(session, limit)
+        if not messages:
+            return 0
+
+        errors = deliver_batch([(m.to_email, m.subject, m.body) for m in messages])
+
+        for message, error in zip(messages, errors):
+            if error is None:
+                mark_sent(message)
+                print(f"[OK] Письмо {message.id} отправлено на {message.to_email}")
+            else:
+                mark_failed(message, error)
+                print(f"[ERROR] Письмо {message.id} не отправлено (попытка {message.attempts}): {error}")
+            session.add(message)
+
+        session.commit()
+        return len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка писем из очереди emailoutbox")
+    parser.add_argument("--once", action="store_true", help="разобрать очередь и завершиться (для cron)")
+    args = parser.parse_args()
+
+    while True:
+        processed = process_batch()
+        if processed == BATCH_SIZE:
+            continue
+        if args.once:
+            break
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlmodel import Session
+from database import engine
+from utils.item_import import BATCH_SIZE, detect_format, read_records, import_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт оборудования из CSV или JSONL")
+    parser.add_argument("path", help="путь к файлу")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="по умолчанию — по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error("не удалось определить формат, укажите --format")
+
+    started = time.perf_counter()
+    with open(args.path, encoding="utf-8-sig", newline="") as stream, Session(engine) as session:
+        report = import_items(session, read_records(stream, fmt), args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    for error in report.errors:
+        print(f"  строка {error['row']}: {error['error']}")
+    if report.failed > len(report.errors):
+        print(f"  ... и ещё {report.failed - len(report.errors)}")
+    rate = report.inserted / elapsed if elapsed else 0
+    print(f"[OK] Добавлено: {report.inserted}, с ошибками: {report.failed}, {elapsed:.1f} с ({rate:.0f} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from sqlmodel import Session
 from database import engine
-from models import RequestStatus, UserType, ItemStatus
+from models import RequestStatus, UserType, ItemStatus, TableVersion
+from utils.table_versions import TRACKED_TABLES
 
 
 def seed_data():
@@ -29,6 +30,10 @@ def seed_data():
         for name in user_types:
             session.add(UserType(name=name))
 
+        # Счётчики изменений
+        for name in TRACKED_TABLES:
+            session.add(TableVersion(name=name))
+
         session.commit()
         print("Начальные данные успешно добавлены.")
 
@@ -0,0 +1,80 @@
+import threading
+from typing import Dict, Optional
+from sqlmodel import Session, select
+from database import engine
+from models import RequestStatus, ItemStatus, UserType
+
+
+class Lookup:
+    """
+    Справочник (RequestStatus, ItemStatus, UserType), загружаемый из БД один раз.
+    Константы задаются русскими названиями из init_data.py, а id берутся из таблицы:
+
+        request_status.CANCELLED  # -> id статуса 'Отменена'
+    """
+
+    def __init__(self, model, **names: str):
+        self.model = model
+        self.names = names
+        self._ids: Dict[str, int] = {}
+        self._names_by_id: Dict[int, str] = {}
+
+    def load(self, session: Session):
+        rows = session.exec(select(self.model)).all()
+        by_name = {row.name: row.id for row in rows}
+
+        missing = [name for name in self.names.values() if name not in by_name]
+        if missing:
+            raise RuntimeError(f"В таблице {self.model.__tablename__} нет значений: {', '.join(missing)}")
+
+        self._names_by_id = {row.id: row.name for row in rows}
+        self._ids = {key: by_name[name] for key, name in self.names.items()}
+
+    def __getattr__(self, key: str) -> int:
+        if key not in self.__dict__.get("names", {}):
+            raise AttributeError(key)
+        if not self._ids:
+            load_lookups()
+        return self._ids[key]
+
+    def name_of(self, lookup_id: int) -> Optional[str]:
+        if not self._ids:
+            load_lookups()
+        return self._names_by_id.get(lookup_id)
+
+
+request_status = Lookup(
+    RequestStatus,
+    CREATED="Создана",
+    REJECTED="Отклонена",
+    AWAITING_PICKUP="Ожидает получения",
+    ISSUED="Выдано",
+    AWAITING_RETURN="Ожидает возврата",
+    RETURNED="Возвращено",
+    OVERDUE="Просрочено",
+    CANCELLED="Отменена",
+)
+
+item_status = Lookup(
+    ItemStatus,
+    FREE="Свободен",
+    ISSUED="Выдан",
+    BROKEN="Сломан",
+    BOOKED="Забронирован",
+)
+
+user_type = Lookup(
+    UserType,
+    STUDENT="Студент",
+    STAFF="Сотрудник",
+    ADMIN="Админ",
+)
+
+_lock = threading.Lock()
+
+
+def load_lookups():
+    # Вызывается при старте приложения и из POST /admin/lookups/reload
+    with _lock, Session(engine) as session:
+        for lookup in (request_status, item_status, user_type):
+            lookup.load(session)
@@ -1,15 +1,37 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from api import users, requests, items, auth, support, cells
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from api import users, requests, items, auth, support, cells, admin
+from lookups import load_lookups
+
+# Ответы меньше этого размера (в байтах) не сжимаются: выигрыш не окупает CPU
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Справочники статусов и типов пользователей грузятся один раз при старте
+    load_lookups()
+    yield
+
 
 app = FastAPI(
     title="SmartLocker API",
     description="API для мобильного приложения бронирования и выдачи оборудования",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson сериализует списки предметов и заявок в разы быстрее стандартного json
+    default_response_class=ORJSONResponse,
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 app.include_router(users.router)
 app.include_router(requests.router)
 app.include_router(items.router)
 app.include_router(auth.router)
 app.include_router(support.router)
 app.include_router(cells.router)
+app.include_router(admin.router)
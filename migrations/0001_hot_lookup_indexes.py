@@ -0,0 +1,48 @@
+"""
+Индексы для горячих запросов: email пользователя и кода регистрации,
+заявки по пользователю/оборудованию/дате, уникальный активный код постамата.
+
+Запуск: python migrations/0001_hot_lookup_indexes.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import update
+from sqlmodel import Session
+from database import engine
+from models import User, RegistrationCode, Request, ArchivedRequest
+
+INDEXES = {
+    "ix_user_email",
+    "ix_registrationcode_email",
+    "ix_request_item_id",
+    "ix_request_user_created",
+    "ix_request_created_id",
+    "ix_request_planned_return_date",
+    "uq_request_postamat_code",
+    "ix_archivedrequest_user_created",
+}
+
+
+def upgrade():
+    # Истёкшие коды больше не принимаются постаматом; убираем их,
+    # чтобы старые дубликаты не помешали уникальному индексу
+    with Session(engine) as session:
+        session.exec(
+            update(Request)
+            .where(Request.code_expiry < datetime.utcnow())
+            .values(postamat_code=None)
+        )
+        session.commit()
+
+    for model in (User, RegistrationCode, Request, ArchivedRequest):
+        for index in model.__table__.indexes:
+            if index.name in INDEXES:
+                index.create(engine, checkfirst=True)
+                print(f"[OK] {index.name}")
+
+
+if __name__ == "__main__":
+    upgrade()
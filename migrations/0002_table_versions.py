@@ -0,0 +1,28 @@
+"""
+Таблица счётчиков изменений (tableversion) для инвалидации кэшей.
+
+Запуск: python migrations/0002_table_versions.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlmodel import Session
+from database import engine
+from models import TableVersion
+from utils.table_versions import TRACKED_TABLES
+
+
+def upgrade():
+    TableVersion.__table__.create(engine, checkfirst=True)
+
+    with Session(engine) as session:
+        for name in TRACKED_TABLES:
+            if session.get(TableVersion, name) is None:
+                session.add(TableVersion(name=name))
+        session.commit()
+    print("[OK] tableversion")
+
+
+if __name__ == "__main__":
+    upgrade()
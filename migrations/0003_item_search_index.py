@@ -0,0 +1,27 @@
+"""
+GIN-индекс для полнотекстового поиска по каталогу (/items/search).
+Нужен только на Postgres: на других БД поиск идёт по индексу в памяти.
+
+Запуск: python migrations/0003_item_search_index.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import engine
+from models import Item
+
+
+def upgrade():
+    if engine.dialect.name != "postgresql":
+        print("[SKIP] ix_item_search: только для Postgres")
+        return
+
+    for index in Item.__table__.indexes:
+        if index.name == "ix_item_search":
+            index.create(engine, checkfirst=True)
+            print(f"[OK] {index.name}")
+
+
+if __name__ == "__main__":
+    upgrade()
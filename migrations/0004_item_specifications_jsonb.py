@@ -0,0 +1,41 @@
+"""
+Item.specifications: json -> jsonb на Postgres, GIN-индекс для фильтров
+по характеристикам и пересоздание индекса поиска (теперь на jsonb_to_tsvector).
+
+Запуск: python migrations/0004_item_specifications_jsonb.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from database import engine
+from models import Item
+
+INDEXES = ("ix_item_specifications", "ix_item_search")
+
+
+def upgrade():
+    if engine.dialect.name != "postgresql":
+        print("[SKIP] specifications jsonb: только для Postgres")
+        return
+
+    columns = {column["name"]: column for column in inspect(engine).get_columns("item")}
+    if not isinstance(columns["specifications"]["type"], JSONB):
+        with engine.begin() as connection:
+            # Старый индекс поиска построен на json_to_tsvector и не переживёт смену типа
+            connection.execute(text("DROP INDEX IF EXISTS ix_item_search"))
+            connection.execute(text(
+                "ALTER TABLE item ALTER COLUMN specifications TYPE jsonb USING specifications::jsonb"
+            ))
+        print("[OK] item.specifications -> jsonb")
+
+    for index in Item.__table__.indexes:
+        if index.name in INDEXES:
+            index.create(engine, checkfirst=True)
+            print(f"[OK] {index.name}")
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,26 @@
+"""
+Колонка item.size: минимальный размер ячейки для предмета (для подбора ячейки).
+
+Запуск: python migrations/0005_item_size.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import inspect, text
+from database import engine
+
+
+def upgrade():
+    columns = {column["name"] for column in inspect(engine).get_columns("item")}
+    if "size" in columns:
+        print("[SKIP] item.size уже есть")
+        return
+
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE item ADD COLUMN size VARCHAR"))
+    print("[OK] item.size")
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import Optional
 from sqlmodel import Field, SQLModel, Column, Integer, String, ForeignKey, JSON
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from utils.item_search import search_document
 
 
 # Пользователи и типы
@@ -14,7 +16,7 @@ class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     active: bool = Field(default=True)
     name: Optional[str] = Field(default=None, nullable=True)
-    email: str
+    email: str = Field(index=True)
     phone: Optional[str] = Field(default=None, nullable=True)
     created: Optional[datetime] = Field(default_factory=datetime.utcnow)
     card_id: Optional[str] = Field(default=None, nullable=True)
@@ -43,7 +45,9 @@ class Request(SQLModel, table=True):
     takendate: Optional[datetime] = Field(default=None, nullable=True)
     planned_return_date: datetime
     return_date: Optional[datetime] = Field(default=None, nullable=True)
-    item_id: int = Field(sa_column=Column(Integer, ForeignKey("item.id", ondelete='CASCADE'), nullable=False))
+    item_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("item.id", ondelete='CASCADE'), nullable=False, index=True)
+    )
     postamat_code: Optional[str] = None
     code_expiry: Optional[datetime] = None
 
@@ -63,6 +67,22 @@ class ArchivedRequest(SQLModel, table=True):
     code_expiry: Optional[datetime] = None
 
 
+# Индексы для горячих запросов по заявкам
+Index("ix_request_user_created", Request.user, Request.created.desc())
+Index("ix_request_created_id", Request.created.desc(), Request.id.desc())
+Index("ix_request_planned_return_date", Request.planned_return_date)
+# Активный код постамата уникален: по нему ищется заявка при выдаче и возврате.
+# После выдачи и по истечении срока (auto_cancel_expired_requests.py) код обнуляется
+Index(
+    "uq_request_postamat_code",
+    Request.postamat_code,
+    unique=True,
+    postgresql_where=Request.postamat_code.is_not(None),
+    sqlite_where=Request.postamat_code.is_not(None),
+)
+Index("ix_archivedrequest_user_created", ArchivedRequest.user, ArchivedRequest.created.desc())
+
+
 # Оборудование
 class ItemStatus(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -92,7 +112,10 @@ class Item(SQLModel, table=True):
     owner: str
     available: bool
     access_level: int
-    specifications: dict = Field(sa_type=JSON)
+    # На Postgres — JSONB: его можно индексировать и фильтровать по содержимому (@>)
+    specifications: dict = Field(sa_type=JSON().with_variant(JSONB(), "postgresql"))
+    # Минимальный размер ячейки: 'S', 'M', 'L' (None — помещается в любую)
+    size: Optional[str] = Field(default=None, nullable=True)
     # Новое поле: в какой ячейке лежит предмет
     cell: Optional[int] = Field(
         default=None,
@@ -104,8 +127,58 @@ class Item(SQLModel, table=True):
     )
 
 
+# Фильтры по характеристикам (specifications @> ...) и полнотекстовый поиск — только Postgres
+Index(
+    "ix_item_specifications",
+    Item.specifications,
+    postgresql_using="gin",
+    postgresql_ops={"specifications": "jsonb_path_ops"},
+).ddl_if(dialect="postgresql")
+# См. utils/item_search.py
+Item.__table__.append_constraint(
+    Index("ix_item_search", search_document(Item.__table__.c), postgresql_using="gin").ddl_if(dialect="postgresql")
+)
+
+
+# Refresh-токены: в БД хранится только sha256 от токена
+class RefreshToken(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    )
+    token_hash: str = Field(unique=True, index=True)
+    created: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+    revoked_at: Optional[datetime] = Field(default=None, nullable=True)
+
+
 class RegistrationCode(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    email: str
+    email: str = Field(index=True)
     code: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Очередь исходящих писем (outbox)
+class EmailOutbox(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    to_email: str
+    subject: str
+    body: str
+    status: str = Field(default="pending")  # Значения: 'pending', 'sent', 'failed'
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None, nullable=True)
+    created: datetime = Field(default_factory=datetime.utcnow)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = Field(default=None, nullable=True)
+
+    __table_args__ = (
+        Index("ix_emailoutbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+# Счётчики изменений таблиц: по ним инвалидируются кэши в памяти воркеров
+class TableVersion(SQLModel, table=True):
+    name: str = Field(primary_key=True)  # Значения: 'item', 'request', 'cell'
+    version: int = Field(default=0)
+    updated: datetime = Field(default_factory=datetime.utcnow)
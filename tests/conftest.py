@@ -0,0 +1,124 @@
+"""
+Общие фикстуры. Тесты работают с отдельной SQLite-базой во временном каталоге;
+TEST_DATABASE_URL позволяет прогнать их на Postgres (например, EXPLAIN-тесты индексов).
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_DB_DIR = tempfile.mkdtemp(prefix="smartlocker-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_DB_DIR}/test.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SQL_ECHO", "0")
+os.environ.setdefault("EMAIL_FROM", "noreply-smartlocker@example.com")
+
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel
+
+from database import engine, get_async_engine
+from init_data import seed_data
+from lookups import load_lookups, item_status, request_status, user_type
+from models import Cell, CellLocation, Item, Request, User
+from api.auth import create_access_token, user_cache
+from api.items import _available_snapshot
+from utils.cell_allocator import free_cells
+from utils.item_search import item_search_index
+from utils.postamat_codes import postamat_codes
+
+
+def reset_process_caches():
+    # Кэши в памяти процесса переживают пересоздание базы между тестами
+    user_cache.clear()
+    _available_snapshot["versions"] = None
+    item_search_index.version = None
+    for code in list(postamat_codes._by_code):
+        postamat_codes.discard(code)
+    free_cells._loaded_at = None
+
+
+@pytest.fixture
+def db():
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    seed_data()
+    load_lookups()
+    reset_process_caches()
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(db):
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def make_user(session: Session, email: str, kind: str = "STUDENT", **fields) -> User:
+    fields.setdefault("password", "-")
+    user = User(email=email, user_type=getattr(user_type, kind), **fields)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+
+def make_item(session: Session, name: str = "Ноутбук", **fields) -> Item:
+    values = dict(inv_key=f"INV-{name}", owner="МИЭМ", status=item_status.FREE, available=True,
+                  access_level=1, specifications={})
+    values.update(fields)
+    item = Item(name=name, **values)
+    session.add(item)
+    session.commit()
+    session.refresh(item)
+    return item
+
+
+def make_request(session: Session, user: User, item: Item, status: str = "CREATED", **fields) -> Request:
+    values = dict(comment="", created=datetime.utcnow(), planned_return_date=datetime.utcnow() + timedelta(days=3))
+    values.update(fields)
+    request = Request(status=getattr(request_status, status), user=user.id, issued_by=user.id, item_id=item.id,
+                      **values)
+    session.add(request)
+    session.commit()
+    session.refresh(request)
+    return request
+
+
+def make_cells(session: Session, sizes: str):
+    location = CellLocation(name="по центру")
+    session.add(location)
+    session.commit()
+    for size in sizes:
+        session.add(Cell(size=size, location_id=location.id))
+    session.commit()
+
+
+@contextmanager
+def count_queries():
+    """Считает SQL-запросы к обоим движкам (sync и async) внутри блока."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = (engine, get_async_engine().sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", record)
@@ -0,0 +1,79 @@
+"""
+Минимальный SMTP-сервер для тестов: принимает письма без авторизации и TLS,
+считает соединения, может обрывать сессию после N писем (проверка переподключения)
+и отклонять отдельных получателей (проверка повторных попыток).
+"""
+import socketserver
+import threading
+from typing import Iterable, List, Optional
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server: StubSMTPServer = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ESMTP")
+        delivered = 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+
+            if command.startswith("EHLO"):
+                self.reply("250-stub")
+                self.reply("250 8BITMIME")
+            elif command.startswith("RCPT") and any(address.upper() in command for address in server.reject):
+                self.reply("550 Mailbox unavailable")
+            elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line == b".\r\n":
+                        break
+                    body.append(data_line)
+                with server.lock:
+                    server.messages.append(b"".join(body))
+                self.reply("250 OK")
+                delivered += 1
+                if server.drop_after and delivered >= server.drop_after:
+                    # Сервер закрывает сессию без QUIT, как делают почтовые провайдеры по таймауту
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, drop_after: Optional[int] = None, reject: Iterable[str] = ()):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.drop_after = drop_after
+        self.reject = set(reject)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages: List[bytes] = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,59 @@
+"""
+Бенчмарк /requests/my при высокой конкурентности: прежний sync-обработчик
+(threadpool + Session) против текущего async-эндпоинта (AsyncSession).
+Запрос к БД у обоих одинаковый, сравнивается только путь выполнения.
+На SQLite (aiosqlite — тот же файл через отдельный поток) async обычно не быстрее;
+показательные цифры — на Postgres через TEST_DATABASE_URL, где sync-путь упирается в threadpool.
+"""
+import asyncio
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from sqlmodel import Session
+from conftest import auth_headers, make_item, make_request, make_user
+from api.auth import get_current_user, get_session
+from api.projections import request_list_statement
+from models import Item, Request, User
+
+CONCURRENCY = 200
+ROWS = 20
+
+sync_app = FastAPI()
+
+
+@sync_app.get("/requests/my")
+def get_my_requests_sync(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+    rows = session.exec(
+        request_list_statement(Request, Request.planned_return_date, Item.specifications.label("item_specs"))
+        .where(Request.user == current_user.id)
+        .order_by(Request.created.desc())
+    ).all()
+    return [{"id": row.id, "item_name": row.item_name, "status": row.status_name} for row in rows]
+
+
+async def requests_per_second(app, headers: dict) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        # Прогрев: кэш пользователя и пул соединений
+        assert (await client.get("/requests/my", headers=headers)).status_code == 200
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/requests/my", headers=headers) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - started
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(len(response.json()) == ROWS for response in responses)
+    return CONCURRENCY / elapsed
+
+
+def test_benchmark_requests_my_sync_vs_async(db):
+    from main import app
+
+    user = make_user(db, "student@edu.hse.ru")
+    for number in range(ROWS):
+        make_request(db, user, make_item(db, f"Ноутбук {number}"))
+    headers = auth_headers(user)
+
+    before = asyncio.run(requests_per_second(sync_app, headers))
+    after = asyncio.run(requests_per_second(app, headers))
+
+    print(f"\n[bench] /requests/my, {CONCURRENCY} одновременных запросов: "
+          f"sync {before:.0f} запр/с, async {after:.0f} запр/с")
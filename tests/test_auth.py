@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timedelta
+from passlib.context import CryptContext
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from conftest import make_user
+from api.auth import create_access_token, get_current_user, get_current_user_async, hash_refresh_token, user_cache
+from database import engine, get_async_engine
+from models import RefreshToken, User
+
+
+def test_cached_user_is_a_separate_instance_attached_to_each_session(db):
+    user_id = make_user(db, "student@edu.hse.ru", name="Студент").id
+    token = create_access_token({"sub": "student@edu.hse.ru"})
+
+    with Session(engine) as session:
+        get_current_user(token, session)
+    assert user_cache.get("student@edu.hse.ru") is not None
+
+    with Session(engine) as first, Session(engine) as second:
+        user = get_current_user(token, first)
+        other = get_current_user(token, second)
+        assert user is not other
+        assert user in first and other in second
+
+        # Изменения в одном запросе не протекают ни в кэш, ни в другие запросы
+        user.name = "Изменено"
+        assert other.name == "Студент"
+        assert get_current_user(token, second).name == "Студент"
+        first.commit()
+
+    db.expire_all()
+    assert db.get(User, user_id).name == "Изменено"
+
+
+def test_cached_user_is_attached_to_async_session(db):
+    make_user(db, "student@edu.hse.ru")
+    token = create_access_token({"sub": "student@edu.hse.ru"})
+
+    async def scenario():
+        async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+            loaded = await get_current_user_async(token, session)
+        async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+            cached = await get_current_user_async(token, session)
+            return loaded, cached, cached in session
+
+    loaded, cached, attached = asyncio.run(scenario())
+    assert cached is not loaded and attached
+    assert cached.email == "student@edu.hse.ru"
+
+
+PASSWORD = "correct horse"
+
+
+def login(client, db) -> dict:
+    # Минимальная стоимость bcrypt: проверяется поток токенов, а не хеширование
+    make_user(db, "student@edu.hse.ru", password=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(PASSWORD))
+    response = client.post("/auth/token", data={"username": "student@edu.hse.ru", "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+def refresh(client, token: str):
+    return client.post("/auth/refresh", json={"refresh_token": token})
+
+
+def stored_token(session, token: str) -> RefreshToken:
+    session.expire_all()
+    return session.exec(select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token))).one()
+
+
+def test_refresh_rotates_token(client, db):
+    tokens = login(client, db)
+
+    response = refresh(client, tokens["refresh_token"])
+
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {rotated['access_token']}"}).status_code == 200
+    assert stored_token(db, tokens["refresh_token"]).revoked_at is not None
+    assert stored_token(db, rotated["refresh_token"]).revoked_at is None
+    # Только хеш: сам токен в БД не хранится
+    assert db.exec(select(RefreshToken).where(RefreshToken.token_hash == rotated["refresh_token"])).first() is None
+
+
+def test_reused_refresh_token_revokes_all_user_tokens(client, db):
+    first = login(client, db)["refresh_token"]
+    second = refresh(client, first).json()["refresh_token"]
+    # Параллельная сессия того же пользователя (другое устройство)
+    other_device = client.post("/auth/token", data={"username": "student@edu.hse.ru", "password": PASSWORD})
+    other_device = other_device.json()["refresh_token"]
+
+    reused = refresh(client, first)
+
+    assert reused.status_code == 401
+    assert refresh(client, second).status_code == 401
+    assert refresh(client, other_device).status_code == 401
+    assert db.exec(select(RefreshToken).where(RefreshToken.revoked_at.is_(None))).all() == []
+
+
+def test_logout_revokes_refresh_token(client, db):
+    token = login(client, db)["refresh_token"]
+
+    assert client.post("/auth/logout", json={"refresh_token": token}).status_code == 200
+    assert refresh(client, token).status_code == 401
+    # Выход с неизвестным или уже отозванным токеном не раскрывает, был ли он действителен
+    assert client.post("/auth/logout", json={"refresh_token": token}).status_code == 200
+    assert client.post("/auth/logout", json={"refresh_token": "unknown"}).status_code == 200
+
+
+def test_expired_or_unknown_refresh_token_is_rejected(client, db):
+    token = login(client, db)["refresh_token"]
+    stored = stored_token(db, token)
+    stored.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.add(stored)
+    db.commit()
+
+    assert refresh(client, token).status_code == 401
+    assert refresh(client, "unknown").status_code == 401
+    # Истёкший токен — не признак утечки: остальные токены пользователя не отзываются
+    assert stored_token(db, token).revoked_at is None
+
+
+def test_password_change_revokes_refresh_tokens(client, db):
+    tokens = login(client, db)
+
+    response = client.post(
+        "/auth/reset-password",
+        json={"old_password": PASSWORD, "new_password": "new password"},
+        headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+
+    assert response.status_code == 200
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
@@ -0,0 +1,60 @@
+"""
+Нагрузочный тест брони: сотни одновременных заявок на один предмет — ровно одна проходит,
+остальные быстро получают отказ. Задержки печатаются с pytest -s.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+import httpx
+from sqlmodel import select
+from conftest import auth_headers, make_item, make_user
+from lookups import item_status
+from models import Item, Request
+
+BOOKINGS = 200
+USERS = 20
+
+
+async def book_concurrently(app, item_id: int, headers: list):
+    body = {"item_id": item_id, "planned_return_date": (datetime.utcnow() + timedelta(days=3)).isoformat()}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        # Прогрев кэша пользователей: иначе первые запросы ждут соединение ещё в get_current_user
+        for user_headers in headers:
+            assert (await client.get("/requests/my", headers=user_headers)).status_code == 200
+
+        async def book(number: int):
+            started = time.perf_counter()
+            response = await client.post("/requests/", json=body, headers=headers[number % len(headers)])
+            return response.status_code, (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(*(book(number) for number in range(BOOKINGS)))
+
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def test_only_one_of_many_concurrent_bookings_wins(db):
+    from main import app
+
+    item = make_item(db)
+    headers = [auth_headers(make_user(db, f"student{number}@edu.hse.ru")) for number in range(USERS)]
+
+    results = asyncio.run(book_concurrently(app, item.id, headers))
+
+    statuses = [status for status, _ in results]
+    latencies = [latency for _, latency in results]
+    losers = [latency for status, latency in results if status != 200]
+    print(f"\n[bench] {BOOKINGS} одновременных броней: p50 {percentile(latencies, 0.5):.1f} мс, "
+          f"p95 {percentile(latencies, 0.95):.1f} мс, max {max(latencies):.1f} мс; "
+          f"отказ p95 {percentile(losers, 0.95):.1f} мс")
+
+    assert statuses.count(200) == 1
+    # 409 — проиграл условный UPDATE, 400 — предмет уже занят к моменту чтения
+    assert set(statuses) <= {200, 400, 409}
+    db.expire_all()
+    assert len(db.exec(select(Request).where(Request.item_id == item.id)).all()) == 1
+    item = db.get(Item, item.id)
+    assert (item.available, item.status) == (False, item_status.BOOKED)
@@ -0,0 +1,95 @@
+import threading
+import time
+import pytest
+from sqlmodel import Session, select
+from conftest import make_cells
+from database import engine
+from models import Cell
+from utils.cell_allocator import NoFreeCell, allocate_cell, free_cells, release_cell
+
+WORKERS = 16
+BENCHMARK_ROUNDS = 200
+
+
+def allocate_concurrently(size, workers: int):
+    claimed, failed, errors = [], [], []
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        barrier.wait()
+        try:
+            with Session(engine) as session:
+                cell_id = allocate_cell(session, size)
+                session.commit()
+            claimed.append(cell_id)
+        except NoFreeCell:
+            failed.append(None)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    return claimed, failed
+
+
+def test_concurrent_allocations_never_share_a_cell(db):
+    make_cells(db, "SSSMML")
+
+    claimed, failed = allocate_concurrently(None, WORKERS)
+
+    assert sorted(claimed) == [1, 2, 3, 4, 5, 6]
+    assert len(failed) == WORKERS - 6
+    assert db.exec(select(Cell).where(Cell.is_free == True)).all() == []
+    assert free_cells.stats() == {"S": 0, "M": 0, "L": 0}
+
+
+def test_allocation_picks_smallest_fitting_cell(db):
+    make_cells(db, "SML")
+
+    with Session(engine) as session:
+        allocated = [allocate_cell(session, "M"), allocate_cell(session, "M")]
+        session.commit()
+        assert allocated == [2, 3]
+        with pytest.raises(NoFreeCell):
+            allocate_cell(session, "M")
+
+
+def test_rollback_leaves_free_cell_map_unchanged(db):
+    make_cells(db, "SS")
+
+    with Session(engine) as session:
+        first = allocate_cell(session, "S")
+        session.commit()
+        before = free_cells.stats()
+
+        allocate_cell(session, "S")
+        session.rollback()
+        assert free_cells.stats() == before
+
+        release_cell(session, first)
+        session.rollback()
+        assert free_cells.stats() == before
+
+        release_cell(session, first)
+        session.commit()
+        assert free_cells.stats() == {"S": 2, "M": 0, "L": 0}
+
+
+def test_benchmark_allocate_and_release(db):
+    make_cells(db, "SSSSSMMMMMLLLLL")
+
+    with Session(engine) as session:
+        started = time.perf_counter()
+        for _ in range(BENCHMARK_ROUNDS):
+            cell_id = allocate_cell(session, "M")
+            session.commit()
+            release_cell(session, cell_id)
+            session.commit()
+        rate = BENCHMARK_ROUNDS / (time.perf_counter() - started)
+
+    print(f"\n[bench] allocate_cell + release_cell с коммитами: {rate:.0f} циклов/с")
+    assert free_cells.stats() == {"S": 5, "M": 5, "L": 5}
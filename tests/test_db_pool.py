@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from database import InstrumentedAsyncQueuePool, InstrumentedQueuePool, engine_options, pool_status
+
+POOL = dict(pool_size=1, max_overflow=0, pool_timeout=0.3)
+
+
+def test_engine_options_instrument_both_pools():
+    url = "postgresql://smartlocker@localhost/smartlocker"
+    assert engine_options(url)["poolclass"] is InstrumentedQueuePool
+    assert engine_options(url, is_async=True)["poolclass"] is InstrumentedAsyncQueuePool
+
+
+def test_sync_pool_counts_waiting_and_timeouts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=InstrumentedQueuePool, **POOL)
+    seen_waiting = []
+
+    with engine.connect():
+        def watch():
+            time.sleep(0.1)
+            seen_waiting.append(pool_status(engine.pool)["waiting"])
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+        watcher.join()
+
+    status = pool_status(engine.pool)
+    engine.dispose()
+    assert seen_waiting == [1]
+    assert (status["waiting"], status["timeouts"], status["checked_out"]) == (0, 1, 0)
+
+
+def test_async_pool_counts_waiting_and_timeouts(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", poolclass=InstrumentedAsyncQueuePool, **POOL)
+
+    async def scenario():
+        async with engine.connect() as held:
+            await held.execute(text("SELECT 1"))
+
+            async def second():
+                async with engine.connect():
+                    pass
+
+            waiter = asyncio.create_task(second())
+            await asyncio.sleep(0.1)
+            waiting = pool_status(engine.sync_engine.pool)["waiting"]
+            with pytest.raises(PoolTimeoutError):
+                await waiter
+        # dispose() пересоздаёт пул вместе со счётчиками
+        status = pool_status(engine.sync_engine.pool)
+        await engine.dispose()
+        return waiting, status
+
+    waiting, status = asyncio.run(scenario())
+    assert waiting == 1
+    assert (status["pool"], status["waiting"], status["timeouts"]) == ("InstrumentedAsyncQueuePool", 0, 1)
@@ -0,0 +1,109 @@
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import select
+from smtp_stub import StubSMTPServer
+import email_worker
+from models import EmailOutbox
+from utils import email_sender
+from utils.email_outbox import MAX_ATTEMPTS, RETRY_MAX_SECONDS, enqueue_email, enqueue_emails, retry_delay
+from utils.smtp_transport import SMTPPool
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    """Запускает SMTP-заглушку и направляет в неё пул, которым пользуется email_worker."""
+    with ExitStack() as stack:
+        def start(**options) -> StubSMTPServer:
+            server = stack.enter_context(StubSMTPServer(**options))
+            pool = SMTPPool(1, "127.0.0.1", server.port, None, None, use_ssl=False)
+            stack.callback(pool.close)
+            monkeypatch.setattr(email_sender, "smtp_pool", pool)
+            return server
+
+        yield start
+
+
+def outbox(session) -> dict:
+    session.expire_all()
+    return {message.to_email: message for message in session.exec(select(EmailOutbox)).all()}
+
+
+def drain() -> int:
+    # Как email_worker.py --once: пачки, пока очередь не опустеет
+    total = 0
+    while True:
+        processed = email_worker.process_batch()
+        total += processed
+        if processed < email_worker.BATCH_SIZE:
+            return total
+
+
+def test_worker_drains_outbox_and_marks_sent(db, smtp):
+    server = smtp()
+    enqueue_emails(db, [(f"user{number}@edu.hse.ru", "Напоминание", f"Письмо {number}") for number in range(25)])
+    db.commit()
+
+    assert drain() == 25
+
+    messages = outbox(db)
+    assert {message.status for message in messages.values()} == {"sent"}
+    assert all(message.sent_at is not None and message.attempts == 0 for message in messages.values())
+    assert len(server.messages) == 25
+    # Две пачки по одной SMTP-сессии из пула
+    assert server.connections == 1
+    assert drain() == 0
+
+
+def test_failed_message_is_retried_with_backoff(db, smtp):
+    enqueue_email("bad@edu.hse.ru", "Напоминание", "Текст", session=db)
+    enqueue_email("good@edu.hse.ru", "Напоминание", "Текст", session=db)
+    db.commit()
+
+    server = smtp(reject=["bad@edu.hse.ru"])
+    before = datetime.utcnow()
+    assert email_worker.process_batch() == 2
+    assert len(server.messages) == 1
+
+    messages = outbox(db)
+    assert messages["good@edu.hse.ru"].status == "sent"
+    failed = messages["bad@edu.hse.ru"]
+    assert (failed.status, failed.attempts, failed.sent_at) == ("pending", 1, None)
+    assert "550" in failed.last_error
+    assert failed.next_attempt_at >= before + retry_delay(1)
+    # До истечения задержки письмо не берётся повторно
+    assert email_worker.process_batch() == 0
+
+    failed.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.add(failed)
+    db.commit()
+    server = smtp()
+    assert email_worker.process_batch() == 1
+
+    retried = outbox(db)["bad@edu.hse.ru"]
+    assert (retried.status, retried.attempts, retried.last_error) == ("sent", 1, None)
+    assert len(server.messages) == 1
+
+
+def test_message_is_given_up_after_max_attempts(db, smtp):
+    message = enqueue_email("bad@edu.hse.ru", "Напоминание", "Текст", session=db)
+    message.attempts = MAX_ATTEMPTS - 1
+    db.commit()
+
+    smtp(reject=["bad@edu.hse.ru"])
+    assert email_worker.process_batch() == 1
+
+    failed = outbox(db)["bad@edu.hse.ru"]
+    assert (failed.status, failed.attempts) == ("failed", MAX_ATTEMPTS)
+    failed.next_attempt_at = datetime.utcnow() - timedelta(hours=1)
+    db.add(failed)
+    db.commit()
+    assert email_worker.process_batch() == 0
+
+
+def test_retry_delay_grows_exponentially_up_to_cap():
+    delays = [retry_delay(attempts).total_seconds() for attempts in range(1, 10)]
+
+    assert delays[:4] == [30, 60, 120, 240]
+    assert delays == sorted(delays)
+    assert max(delays) == RETRY_MAX_SECONDS
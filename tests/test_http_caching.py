@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from fastapi import Response
+from starlette.requests import Request as HTTPRequest
+from conftest import make_item
+from api.caching import conditional_response
+from models import TableVersion
+from utils.table_versions import bump_versions
+
+
+def http_request(**headers) -> HTTPRequest:
+    raw = [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()]
+    return HTTPRequest({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def http_date(moment: datetime) -> str:
+    return format_datetime(moment.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def set_item_updated(session, moment: datetime):
+    row = session.get(TableVersion, "item")
+    row.updated = moment
+    session.add(row)
+    session.commit()
+
+
+def test_item_etag_round_trip_and_invalidation(client, db):
+    item = make_item(db)
+
+    first = client.get(f"/items/{item.id}")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "private, no-cache"
+
+    cached = client.get(f"/items/{item.id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    bump_versions(db, "item")
+    db.commit()
+    changed = client.get(f"/items/{item.id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_missing_item_is_404_even_with_matching_etag(client, db):
+    item = make_item(db)
+    etag = client.get(f"/items/{item.id}").headers["etag"]
+
+    assert client.get(f"/items/{item.id + 1}", headers={"If-None-Match": etag}).status_code == 404
+    assert client.get(f"/items/{item.id + 1}", headers={"If-None-Match": "*"}).status_code == 404
+
+
+def test_if_modified_since(client, db):
+    item = make_item(db)
+    changed_at = datetime(2026, 1, 1, 10, 0, 0, 500000)
+    set_item_updated(db, changed_at)
+
+    response = client.get(f"/items/{item.id}")
+    # Изменение в 10:00:00.5 — Last-Modified округлён вверх до 10:00:01
+    assert response.headers["last-modified"] == http_date(datetime(2026, 1, 1, 10, 0, 1))
+
+    def status_since(moment: datetime) -> int:
+        return client.get(f"/items/{item.id}", headers={"If-Modified-Since": http_date(moment)}).status_code
+
+    assert status_since(datetime(2026, 1, 1, 10, 0, 1)) == 304
+    assert status_since(datetime(2026, 1, 1, 10, 0, 0)) == 200
+    assert status_since(datetime(2026, 1, 1, 9, 0, 0)) == 200
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since(client, db):
+    item = make_item(db)
+    set_item_updated(db, datetime(2026, 1, 1, 10, 0, 0))
+
+    response = client.get(f"/items/{item.id}", headers={
+        "If-None-Match": 'W/"item.999"',
+        "If-Modified-Since": http_date(datetime(2026, 1, 1, 12, 0, 0)),
+    })
+    assert response.status_code == 200
+
+
+def test_no_last_modified_while_its_second_is_still_running():
+    # Второе изменение в ту же секунду получило бы тот же Last-Modified: клиент с If-Modified-Since
+    # этой секунды получил бы 304 на устаревшие данные
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    response = Response()
+    not_modified = conditional_response(
+        http_request(if_modified_since=http_date(now + timedelta(seconds=5))), response, ("item",), (1,), now,
+    )
+
+    assert not_modified is None
+    assert "last-modified" not in response.headers
+    assert response.headers["etag"] == 'W/"item.1"'
@@ -0,0 +1,34 @@
+from conftest import auth_headers, make_item, make_user
+
+
+def items_filtered(client, user, **params):
+    response = client.get("/items/", params=params, headers=auth_headers(user))
+    return response.status_code, sorted(item["name"] for item in response.json()) if response.status_code == 200 else None
+
+
+def test_specification_filters(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    make_item(db, "Ноутбук 16", specifications={"ram": 16, "resolution": "4K", "touch": True})
+    make_item(db, "Ноутбук строка", specifications={"ram": "16", "resolution": "FullHD"})
+    make_item(db, "Ноутбук 8", specifications={"ram": 8, "resolution": "4K", "touch": False})
+
+    # "16" в URL совпадает и с числом, и со строкой
+    assert items_filtered(client, user, **{"specifications.ram": "16"}) == (200, ["Ноутбук 16", "Ноутбук строка"])
+    assert items_filtered(client, user, **{"specifications.resolution": "4K"}) == (200, ["Ноутбук 16", "Ноутбук 8"])
+    assert items_filtered(client, user, **{"specifications.touch": "false"}) == (200, ["Ноутбук 8"])
+    assert items_filtered(client, user, **{"specifications.ram": "16", "specifications.resolution": "4K"}) == (
+        200, ["Ноутбук 16"])
+    assert items_filtered(client, user, specifications_contains='{"resolution": "4K", "ram": 8}') == (
+        200, ["Ноутбук 8"])
+    assert items_filtered(client, user, **{"specifications.gpu": "RTX"}) == (200, [])
+
+
+def test_bad_specification_filters_are_400(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    make_item(db, specifications={"ram": 16})
+
+    assert items_filtered(client, user, **{"specifications.": "16"})[0] == 400
+    assert items_filtered(client, user, specifications_contains="{не json")[0] == 400
+    assert items_filtered(client, user, specifications_contains="[1, 2]")[0] == 400
+    # Вложенные объекты в фильтре — только на Postgres
+    assert items_filtered(client, user, **{"specifications.display": '{"size": 14}'})[0] == 400
@@ -0,0 +1,153 @@
+import json
+import subprocess
+import sys
+import time
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from conftest import ROOT, auth_headers, make_cells, make_user
+from lookups import item_status
+from models import Cell, Item
+from utils import item_import
+from utils.cell_allocator import free_cells
+from utils.item_import import import_items
+from utils.table_versions import get_versions
+
+BENCHMARK_ROWS = 5000
+
+
+def rows(*records):
+    return list(enumerate(records, start=2))
+
+
+def test_unknown_status_is_reported_per_row(db):
+    report = import_items(db, rows(
+        {"inv_key": "INV-1", "name": "Ноутбук", "owner": "МИЭМ"},
+        {"inv_key": "INV-2", "name": "Планшет", "owner": "МИЭМ", "status": 999},
+    ))
+
+    assert report.as_dict()["inserted"] == 1
+    assert report.as_dict()["failed"] == 1
+    assert "неизвестный статус предмета 999" in report.errors[0]["error"]
+    assert [item.inv_key for item in db.exec(select(Item)).all()] == ["INV-1"]
+
+
+def test_rejected_batch_is_rolled_back_and_import_continues(db, monkeypatch):
+    make_cells(db, "SS")
+    free_cells.load(db)
+    insert_batch = item_import._insert_batch
+
+    def failing_insert(session, batch, rejected):
+        inserted = insert_batch(session, batch, rejected)
+        if any(row.name == "сбой" for _, row in batch):
+            raise IntegrityError("INSERT INTO item", {}, Exception("нарушено ограничение"))
+        return inserted
+
+    monkeypatch.setattr(item_import, "_insert_batch", failing_insert)
+    report = import_items(db, rows(
+        {"inv_key": "INV-1", "name": "сбой", "owner": "МИЭМ", "cell": 1},
+        {"inv_key": "INV-2", "name": "Ноутбук", "owner": "МИЭМ"},
+        {"inv_key": "INV-3", "name": "Планшет", "owner": "МИЭМ", "cell": 2},
+    ), batch_size=2)
+
+    result = report.as_dict()
+    assert (result["inserted"], result["failed"]) == (1, 2)
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    assert "БД отклонила пачку строк 2–3" in result["errors"][0]["error"]
+    db.expire_all()
+    assert [item.inv_key for item in db.exec(select(Item)).all()] == ["INV-3"]
+    # Ячейка из откатившейся пачки снова свободна и в БД, и в карте свободных ячеек
+    assert db.get(Cell, 1).is_free and not db.get(Cell, 2).is_free
+    assert free_cells.stats()["S"] == 1
+
+
+CSV_FILE = """inv_key,name,owner,size,cell,allocate_cell,specifications
+INV-1,Ноутбук,МИЭМ,M,3,,"{""ram"": 16}"
+INV-2,Планшет,МИЭМ,S,,true,
+INV-3,Проектор,МИЭМ,L,,,
+"""
+
+
+def imported_items(session):
+    session.expire_all()
+    return {item.inv_key: item for item in session.exec(select(Item).order_by(Item.id)).all()}
+
+
+def test_csv_upload_inserts_rows_and_assigns_cells(client, db):
+    make_cells(db, "SSML")
+    admin = make_user(db, "admin@hse.ru", kind="ADMIN")
+
+    response = client.post("/items/import", headers=auth_headers(admin),
+                           files={"file": ("items.csv", CSV_FILE.encode(), "text/csv")})
+
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 3, "failed": 0, "errors": []}
+    items = imported_items(db)
+    assert [(key, item.cell) for key, item in items.items()] == [("INV-1", 3), ("INV-2", 1), ("INV-3", None)]
+    assert items["INV-1"].specifications == {"ram": 16}
+    assert items["INV-1"].status == item_status.FREE and items["INV-1"].available
+    assert [cell.is_free for cell in db.exec(select(Cell).order_by(Cell.id)).all()] == [False, True, False, True]
+
+
+def test_jsonl_upload_reports_bad_lines_and_keeps_the_rest(client, db):
+    admin = make_user(db, "admin@hse.ru", kind="ADMIN")
+    lines = [
+        json.dumps({"inv_key": "INV-1", "name": "Ноутбук", "owner": "МИЭМ", "specifications": {"cpu": "i5"}}),
+        "{не json",
+        json.dumps({"name": "Без инвентарного номера", "owner": "МИЭМ"}),
+        "",
+        json.dumps({"inv_key": "INV-2", "name": "Планшет", "owner": "ФКН", "available": False,
+                    "status": item_status.BROKEN}),
+    ]
+
+    response = client.post("/items/import", params={"format": "jsonl"}, headers=auth_headers(admin),
+                           files={"file": ("export.txt", "\n".join(lines).encode(), "text/plain")})
+
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (2, 2)
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    assert "inv_key" in result["errors"][1]["error"]
+    items = imported_items(db)
+    assert list(items) == ["INV-1", "INV-2"]
+    assert (items["INV-2"].owner, items["INV-2"].status, items["INV-2"].available) == ("ФКН", item_status.BROKEN, False)
+
+
+def test_import_requires_admin_and_known_format(client, db):
+    student = make_user(db, "student@edu.hse.ru")
+    admin = make_user(db, "admin@hse.ru", kind="ADMIN")
+    upload = {"file": ("items.xlsx", b"-", "application/octet-stream")}
+
+    assert client.post("/items/import", headers=auth_headers(student), files=upload).status_code == 403
+    assert client.post("/items/import", headers=auth_headers(admin), files=upload).status_code == 400
+
+
+def test_cli_imports_file_in_batches(db, tmp_path):
+    path = tmp_path / "items.jsonl"
+    path.write_text("".join(
+        json.dumps({"inv_key": f"INV-{number}", "name": f"Ноутбук {number}", "owner": "МИЭМ"}) + "\n"
+        for number in range(25)
+    ), encoding="utf-8")
+
+    result = subprocess.run([sys.executable, "import_items.py", str(path), "--batch-size", "10"],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert "[OK] Добавлено: 25, с ошибками: 0" in result.stdout
+    assert len(imported_items(db)) == 25
+    assert get_versions(db, "item")[0] == 3
+
+
+def test_benchmark_import_throughput(db):
+    records = rows(*(
+        {"inv_key": f"INV-{number}", "name": f"Ноутбук {number}", "owner": "МИЭМ",
+         "specifications": {"cpu": "Intel Core i5", "ram": 16}}
+        for number in range(BENCHMARK_ROWS)
+    ))
+
+    started = time.perf_counter()
+    report = import_items(db, records)
+    rate = BENCHMARK_ROWS / (time.perf_counter() - started)
+
+    print(f"\n[bench] импорт {BENCHMARK_ROWS} строк пачками по {item_import.BATCH_SIZE}: {rate:.0f} строк/с")
+    assert (report.inserted, report.failed) == (BENCHMARK_ROWS, 0)
+    assert db.exec(select(func.count()).select_from(Item)).one() == BENCHMARK_ROWS
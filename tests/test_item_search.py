@@ -0,0 +1,82 @@
+from sqlalchemy.dialects import postgresql
+from conftest import auth_headers, make_item, make_user
+from models import Item
+from utils.item_search import ItemSearchIndex, search_document, search_query, tokenize
+from utils.table_versions import bump_versions
+
+
+def search(client, user, q: str, **params):
+    return client.get("/items/search", params={"q": q, **params}, headers=auth_headers(user))
+
+
+def names(response) -> list:
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_name_outranks_specifications_and_owner(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    make_item(db, "Камера", owner="Lenovo Lab")
+    make_item(db, "Ноутбук", specifications={"vendor": "Lenovo"})
+    make_item(db, "Lenovo ThinkPad")
+
+    assert names(search(client, user, "lenovo")) == ["Lenovo ThinkPad", "Ноутбук", "Камера"]
+
+
+def test_all_words_are_required_as_prefixes(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    make_item(db, "MacBook Pro", specifications={"ram": 16})
+    make_item(db, "MacBook Air")
+    make_item(db, "iPad Pro")
+
+    assert names(search(client, user, "macb pro")) == ["MacBook Pro"]
+    # Числовые характеристики тоже индексируются
+    assert names(search(client, user, "mac 16")) == ["MacBook Pro"]
+    assert names(search(client, user, "чайник")) == []
+    assert search(client, user, "!!!").status_code == 400
+
+
+def test_limit_and_offset_page_through_ranked_results(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    for number in range(5):
+        make_item(db, f"Ноутбук {number}")
+
+    first = names(search(client, user, "ноутбук", limit=2))
+    second = names(search(client, user, "ноутбук", limit=2, offset=2))
+
+    assert len(first) == 2 and len(second) == 2 and not set(first) & set(second)
+
+
+def test_index_is_rebuilt_when_items_change(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    make_item(db, "Проектор Epson")
+    assert names(search(client, user, "epson")) == ["Проектор Epson"]
+
+    make_item(db, "Сканер Epson")
+    # Без новой версии таблицы item индекс не пересобирается
+    assert names(search(client, user, "epson")) == ["Проектор Epson"]
+    bump_versions(db, "item")
+    db.commit()
+    assert names(search(client, user, "epson")) == ["Проектор Epson", "Сканер Epson"]
+
+
+def test_in_memory_index_weights_nested_specifications():
+    index = ItemSearchIndex()
+    index.rebuild(1, [
+        {"id": 1, "name": "Ноутбук", "inv_key": "INV-1", "owner": "МИЭМ",
+         "specifications": {"ports": ["USB-C", "HDMI"], "display": {"size": 14}, "touch": True}},
+        {"id": 2, "name": "HDMI кабель", "inv_key": "INV-2", "owner": "МИЭМ", "specifications": {}},
+    ])
+
+    assert [item["id"] for item in index.search(tokenize("hdmi"), limit=10)] == [2, 1]
+    assert [item["id"] for item in index.search(tokenize("14"), limit=10)] == [1]
+    # bool не индексируется как слово "true"
+    assert index.search(tokenize("true"), limit=10) == []
+
+
+def test_postgres_document_casts_spec_filter_to_jsonb():
+    sql = str(search_document(Item).compile(dialect=postgresql.dialect()))
+    assert "jsonb_to_tsvector('simple'::regconfig" in sql
+    assert """'["string", "numeric"]'::jsonb""" in sql
+    assert "mac:* & pro:*" in str(search_query(["mac", "pro"]).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
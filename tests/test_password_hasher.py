@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from api import auth
+from utils.password_hasher import HasherBusy, PasswordHasher
+
+BENCHMARK_HASHES = 40
+
+
+class BlockingContext:
+    """Вместо bcrypt: hash ждёт, пока тест не отпустит событие."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def hash(self, password: str) -> str:
+        self.release.wait(5)
+        return f"hashed:{password}"
+
+
+def test_full_pool_sheds_instead_of_queueing():
+    context = BlockingContext()
+    hasher = PasswordHasher(context, workers=1, queue_size=1)
+
+    async def scenario():
+        running = [asyncio.create_task(hasher.hash("a")), asyncio.create_task(hasher.hash("b"))]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HasherBusy):
+            await hasher.hash("c")
+        context.release.set()
+        return await asyncio.gather(*running)
+
+    assert asyncio.run(scenario()) == ["hashed:a", "hashed:b"]
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_cancelled_caller_keeps_slot_until_thread_finishes():
+    context = BlockingContext()
+    hasher = PasswordHasher(context, workers=1, queue_size=0)
+
+    async def scenario():
+        # Клиент отключился: корутину отменили, а bcrypt в потоке продолжает работать
+        task = asyncio.create_task(hasher.hash("a"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        with pytest.raises(HasherBusy):
+            await hasher.hash("b")
+        assert hasher.stats()["in_flight"] == 1
+
+        context.release.set()
+        for _ in range(100):
+            if hasher.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await hasher.hash("c")
+
+    assert asyncio.run(scenario()) == "hashed:c"
+
+
+def test_benchmark_bcrypt_through_pool():
+    # Минимальная стоимость bcrypt, чтобы бенчмарк шёл быстро; соотношение inline/пул от этого не зависит
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    hasher = PasswordHasher(context, workers=4, queue_size=BENCHMARK_HASHES)
+
+    started = time.perf_counter()
+    for number in range(BENCHMARK_HASHES):
+        context.hash(f"password-{number}")
+    inline = BENCHMARK_HASHES / (time.perf_counter() - started)
+
+    async def pooled():
+        return await asyncio.gather(*(hasher.hash(f"password-{number}") for number in range(BENCHMARK_HASHES)))
+
+    started = time.perf_counter()
+    hashes = asyncio.run(pooled())
+    through_pool = BENCHMARK_HASHES / (time.perf_counter() - started)
+
+    stats = hasher.stats()
+    print(f"\n[bench] bcrypt: inline {inline:.0f} хешей/с, через пул из 4 потоков {through_pool:.0f} хешей/с, "
+          f"среднее {stats['avg_ms']} мс, максимум {stats['max_ms']} мс")
+    assert len(hashes) == BENCHMARK_HASHES
+    assert stats["completed"] == BENCHMARK_HASHES and stats["in_flight"] == 0
+
+
+def test_each_busy_rejection_is_a_fresh_503(monkeypatch):
+    async def busy(password: str):
+        raise HasherBusy()
+
+    monkeypatch.setattr(auth.password_hasher, "hash", busy)
+
+    async def rejection() -> HTTPException:
+        with pytest.raises(HTTPException) as caught:
+            await auth.get_password_hash("secret")
+        return caught.value
+
+    first, second = asyncio.run(rejection()), asyncio.run(rejection())
+    assert first is not second
+    assert (first.status_code, first.headers) == (503, {"Retry-After": "5"})
+    assert isinstance(first.__context__, HasherBusy) and first.__context__ is not second.__context__
@@ -0,0 +1,44 @@
+"""
+Число SQL-запросов списочных эндпоинтов не должно зависеть от числа строк (нет N+1).
+"""
+from datetime import datetime, timedelta
+import pytest
+from conftest import auth_headers, count_queries, make_item, make_request, make_user
+from lookups import request_status
+from models import ArchivedRequest
+
+# Сколько запросов допустимо на вызов: данные, счётчики таблиц, авторизация при промахе кэша
+MAX_QUERIES = 3
+
+
+def add_rows(db, user, start: int, count: int):
+    for number in range(start, start + count):
+        item = make_item(db, f"Ноутбук {number}", specifications={"ram": number})
+        make_request(db, user, item)
+        db.add(ArchivedRequest(
+            status=request_status.RETURNED, user=user.id, issued_by=user.id, comment="", item_id=item.id,
+            created=datetime.utcnow(), planned_return_date=datetime.utcnow() + timedelta(days=1),
+        ))
+    db.commit()
+
+
+def queries_per_call(client, url: str, headers: dict) -> int:
+    # Первый вызов прогревает кэши (пользователь, справочники), считается второй
+    assert client.get(url, headers=headers).status_code == 200
+    with count_queries() as statements:
+        assert client.get(url, headers=headers).status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", ["/requests/my", "/requests/history", "/requests/all", "/items/", "/users/"])
+def test_list_endpoint_query_count_does_not_grow_with_rows(client, db, url):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    headers = auth_headers(admin)
+
+    add_rows(db, admin, 0, 2)
+    few = queries_per_call(client, url, headers)
+    add_rows(db, admin, 2, 20)
+    many = queries_per_call(client, url, headers)
+
+    assert few == many
+    assert many <= MAX_QUERIES
@@ -0,0 +1,54 @@
+"""
+Горячие запросы должны идти по индексам из migrations/0001_hot_lookup_indexes.py.
+На SQLite проверяется EXPLAIN QUERY PLAN, на Postgres (TEST_DATABASE_URL) — EXPLAIN
+с выключенным seq scan: если подходящего индекса нет, план всё равно покажет Seq Scan.
+"""
+from datetime import datetime
+import pytest
+from sqlmodel import select
+from database import engine
+from models import ArchivedRequest, RegistrationCode, Request, User
+
+HOT_QUERIES = {
+    "uq_request_postamat_code": select(Request).where(Request.postamat_code == "123456"),
+    "ix_user_email": select(User).where(User.email == "student@edu.hse.ru"),
+    "ix_registrationcode_email": select(RegistrationCode).where(RegistrationCode.email == "student@edu.hse.ru"),
+    "ix_request_user_created": select(Request).where(Request.user == 1).order_by(Request.created.desc()),
+    "ix_request_item_id": select(Request).where(Request.item_id == 1),
+    "ix_request_planned_return_date": select(Request).where(Request.planned_return_date < datetime(2025, 1, 1)),
+    "ix_request_created_id": select(Request).order_by(Request.created.desc(), Request.id.desc()).limit(100),
+    "ix_archivedrequest_user_created": (
+        select(ArchivedRequest).where(ArchivedRequest.user == 1).order_by(ArchivedRequest.created.desc())
+    ),
+}
+
+
+def query_plan(connection, statement) -> str:
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", params).all()
+        return "\n".join(row[0] for row in rows)
+
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    # Последняя колонка — описание шага: "SEARCH request USING INDEX ..." или "SCAN request"
+    return "\n".join(row[-1] for row in rows)
+
+
+def is_sequential_scan(plan: str) -> bool:
+    if engine.dialect.name == "postgresql":
+        return "Seq Scan" in plan
+    return any(line.startswith("SCAN ") and " INDEX " not in line for line in plan.splitlines())
+
+
+@pytest.mark.parametrize("index_name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(db, index_name):
+    with engine.begin() as connection:
+        plan = query_plan(connection, HOT_QUERIES[index_name])
+
+    assert not is_sequential_scan(plan), plan
+    assert index_name in plan, plan
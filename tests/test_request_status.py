@@ -0,0 +1,101 @@
+from sqlmodel import select
+from conftest import auth_headers, make_item, make_request, make_user
+from lookups import item_status, request_status
+from models import ArchivedRequest, Item, Request
+
+
+def batch(client, admin, *updates):
+    response = client.post(
+        "/requests/update-status/batch",
+        json={"updates": [{"request_id": request_id, "status": status} for request_id, status in updates]},
+        headers=auth_headers(admin),
+    )
+    assert response.status_code == 200
+    return {result["request_id"]: result for result in response.json()["results"]}
+
+
+def update_status(client, admin, request_id: int, status: int):
+    return client.post(
+        "/requests/update-status", json={"request_id": request_id, "status": status}, headers=auth_headers(admin)
+    )
+
+
+def test_approve_and_reject_on_same_item_keep_item_booked(client, db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    user = make_user(db, "student@edu.hse.ru")
+    item = make_item(db, available=False, status=item_status.BOOKED, access_level=2)
+    first = make_request(db, user, item)
+    second = make_request(db, user, item)
+
+    results = batch(client, admin, (first.id, request_status.AWAITING_PICKUP), (second.id, request_status.REJECTED))
+
+    assert results[first.id]["success"] and results[second.id]["success"]
+    db.expire_all()
+    assert db.get(Request, first.id).status == request_status.AWAITING_PICKUP
+    item = db.get(Item, item.id)
+    assert (item.available, item.status) == (False, item_status.BOOKED)
+
+
+def test_reject_issued_request_is_refused_in_batch(client, db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    user = make_user(db, "student@edu.hse.ru")
+    item = make_item(db, available=False, status=item_status.ISSUED)
+    issued = make_request(db, user, item, "ISSUED")
+
+    results = batch(client, admin, (issued.id, request_status.REJECTED))
+
+    assert results[issued.id]["success"] is False
+    db.expire_all()
+    assert db.get(Request, issued.id).status == request_status.ISSUED
+    assert db.get(Item, item.id).available is False
+    assert db.exec(select(ArchivedRequest)).all() == []
+
+
+def test_single_endpoint_sets_any_status_without_freeing_issued_item(client, db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    user = make_user(db, "student@edu.hse.ru")
+    item = make_item(db, available=False, status=item_status.ISSUED)
+    issued_id = make_request(db, user, item, "ISSUED").id
+    created_id = make_request(db, user, make_item(db, "Планшет", available=False, status=item_status.BOOKED)).id
+
+    rejected = update_status(client, admin, issued_id, request_status.REJECTED)
+    # Переход не из таблицы пакета: CREATED -> RETURNED
+    returned = update_status(client, admin, created_id, request_status.RETURNED)
+
+    assert (rejected.status_code, returned.status_code) == (200, 200)
+    db.expire_all()
+    assert db.get(Request, issued_id) is None
+    assert [archived.status for archived in db.exec(select(ArchivedRequest)).all()] == [request_status.REJECTED]
+    # Выданный предмет остаётся у пользователя
+    assert db.get(Item, item.id).available is False
+    assert db.get(Request, created_id).status == request_status.RETURNED
+
+
+def test_second_approval_of_item_is_refused(client, db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    user = make_user(db, "student@edu.hse.ru")
+    item = make_item(db, available=False, status=item_status.BOOKED, access_level=2)
+    first = make_request(db, user, item)
+    second = make_request(db, user, item)
+
+    results = batch(client, admin, (first.id, request_status.AWAITING_PICKUP), (second.id, request_status.AWAITING_PICKUP))
+
+    assert results[first.id]["success"] is True
+    assert results[second.id]["success"] is False
+    db.expire_all()
+    assert db.get(Request, second.id).status == request_status.CREATED
+
+
+def test_reject_created_request_frees_item(client, db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    user = make_user(db, "student@edu.hse.ru")
+    item = make_item(db, available=False, status=item_status.BOOKED, access_level=2)
+    request_id = make_request(db, user, item).id
+
+    results = batch(client, admin, (request_id, request_status.REJECTED))
+
+    assert results[request_id]["success"] is True
+    db.expire_all()
+    assert db.get(Request, request_id) is None
+    item = db.get(Item, item.id)
+    assert (item.available, item.status) == (True, item_status.FREE)
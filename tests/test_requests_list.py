@@ -0,0 +1,126 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from conftest import auth_headers, make_item, make_request, make_user
+from api import requests as requests_api
+from api.pagination import CURSOR_HEADER
+from lookups import request_status
+
+START = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def requests_setup(db):
+    admin = make_user(db, "admin@hse.ru", "ADMIN")
+    first = make_user(db, "first@edu.hse.ru")
+    second = make_user(db, "second@edu.hse.ru")
+    laptop, tablet = make_item(db, "Ноутбук"), make_item(db, "Планшет")
+
+    keys = []
+    for number in range(7):
+        created = START + timedelta(hours=number)
+        request = make_request(
+            db, first if number % 2 else second, tablet if number % 3 == 0 else laptop,
+            "ISSUED" if number < 3 else "CREATED",
+            created=created, planned_return_date=created + timedelta(days=3),
+            postamat_code=f"{number:06d}",
+        )
+        keys.append((created, request.id))
+    # Две заявки с одинаковым created: порядок между ними задаёт id
+    for _ in range(2):
+        keys.append((START + timedelta(hours=3), make_request(db, first, laptop, created=START + timedelta(hours=3)).id))
+
+    newest_first = [request_id for _, request_id in sorted(keys, reverse=True)]
+    return {"admin": admin, "first": first, "second": second, "laptop": laptop, "tablet": tablet,
+            "ids": newest_first}
+
+
+def get_all(client, admin, **params):
+    return client.get("/requests/all", params=params, headers=auth_headers(admin))
+
+
+def test_without_limit_or_cursor_everything_comes_unpaginated(client, requests_setup):
+    response = get_all(client, requests_setup["admin"])
+
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == requests_setup["ids"]
+    assert CURSOR_HEADER not in response.headers
+    assert all("postamat_code" not in row for row in response.json())
+
+
+def test_cursor_round_trip_visits_every_request_once(client, requests_setup):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = get_all(client, requests_setup["admin"], **params)
+        assert response.status_code == 200
+        page = [row["id"] for row in response.json()]
+        assert len(page) <= 3
+        seen += page
+        pages += 1
+        cursor = response.headers.get(CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert seen == requests_setup["ids"]
+    # 9 заявок по 3: после полной третьей страницы курсор ещё есть, четвёртая пустая
+    assert pages == 4
+
+
+def test_cursor_without_limit_uses_default_page_size(client, requests_setup, monkeypatch):
+    monkeypatch.setattr(requests_api, "DEFAULT_PAGE_SIZE", 4)
+    admin = requests_setup["admin"]
+    cursor = get_all(client, admin, limit=2).headers[CURSOR_HEADER]
+
+    response = get_all(client, admin, cursor=cursor)
+
+    assert [row["id"] for row in response.json()] == requests_setup["ids"][2:6]
+    assert CURSOR_HEADER in response.headers
+
+
+def test_bad_cursor_and_non_admin_are_rejected(client, requests_setup):
+    assert get_all(client, requests_setup["admin"], cursor="не-курсор").status_code == 400
+    assert get_all(client, requests_setup["admin"], limit=0).status_code == 422
+    assert get_all(client, requests_setup["first"]).status_code == 403
+
+
+def test_filters(client, requests_setup):
+    admin, first, tablet = requests_setup["admin"], requests_setup["first"], requests_setup["tablet"]
+
+    def ids(**params):
+        return [row["id"] for row in get_all(client, admin, **params).json()]
+
+    by_user = get_all(client, admin, user_id=first.id).json()
+    assert len(by_user) == 5 and all(row["user"] == first.id for row in by_user)
+    assert all(row["item_id"] == tablet.id for row in get_all(client, admin, item_id=tablet.id).json())
+    assert len(ids(item_id=tablet.id)) == 3
+    issued = get_all(client, admin, status=request_status.ISSUED).json()
+    assert len(issued) == 3
+    assert {row["status"] for row in issued} == {request_status.ISSUED}
+
+    window = ids(return_from=(START + timedelta(days=3, hours=1)).isoformat(),
+                 return_to=(START + timedelta(days=3, hours=2)).isoformat())
+    assert len(window) == 2
+    assert ids(user_id=first.id, item_id=tablet.id, status=request_status.ISSUED) == []
+
+
+def test_ndjson_streams_the_same_rows(client, requests_setup):
+    admin = requests_setup["admin"]
+
+    response = get_all(client, admin, format="ndjson", fields="id,status,created")
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == requests_setup["ids"]
+    assert set(rows[0]) == {"id", "status", "created"}
+    filtered = get_all(client, admin, format="ndjson", user_id=requests_setup["second"].id).text.splitlines()
+    assert len(filtered) == 4
+
+
+def test_fields_limit_the_columns(client, requests_setup):
+    rows = get_all(client, requests_setup["admin"], fields="id,item_id").json()
+
+    assert all(set(row) == {"id", "item_id"} for row in rows)
+    assert get_all(client, requests_setup["admin"], fields="id,postamat_code").status_code == 400
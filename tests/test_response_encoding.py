@@ -0,0 +1,63 @@
+"""
+Микробенчмарк кодирования ответов /requests/all и /items/: стандартный JSONResponse
+(json.dumps) против ORJSONResponse, плюс проверка gzip для больших ответов.
+"""
+import timeit
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from conftest import auth_headers, make_item, make_user
+
+ROWS = 1000
+REPEAT = 20
+
+
+def requests_payload():
+    now = datetime.utcnow()
+    return [
+        {
+            "id": number, "status": 3, "user": number % 50, "issued_by": number % 50, "comment": "Нужен ноутбук для проекта",
+            "created": now - timedelta(hours=number), "takendate": None,
+            "planned_return_date": now + timedelta(days=3), "return_date": None, "item_id": number,
+        }
+        for number in range(ROWS)
+    ]
+
+
+def items_payload():
+    return [
+        {
+            "id": number, "inv_key": f"INV-{number:05d}", "name": f"Ноутбук Lenovo ThinkPad {number}", "status": 1,
+            "owner": "МИЭМ", "available": True, "access_level": 1, "size": "M", "cell": number % 20 + 1,
+            "specifications": {"cpu": "Intel Core i5", "ram": 16, "ssd": 512, "ports": ["USB-C", "HDMI"]},
+        }
+        for number in range(ROWS)
+    ]
+
+
+def encoding_ms(response_class, content) -> float:
+    return min(timeit.repeat(lambda: response_class(content), number=1, repeat=REPEAT)) * 1000
+
+
+def test_benchmark_json_vs_orjson_encoding():
+    for name, payload in (("/requests/all", requests_payload()), ("/items/", items_payload())):
+        # Так контент выглядит после response_model: datetime уже строки
+        content = jsonable_encoder(payload)
+        before = encoding_ms(JSONResponse, content)
+        after = encoding_ms(ORJSONResponse, content)
+
+        print(f"\n[bench] {name}, {ROWS} строк: json {before:.2f} мс, orjson {after:.2f} мс")
+        assert JSONResponse(content).body.decode() == ORJSONResponse(content).body.decode()
+
+
+def test_large_responses_are_gzipped(client, db):
+    user = make_user(db, "student@edu.hse.ru")
+    for number in range(50):
+        make_item(db, f"Ноутбук {number}", specifications={"cpu": "Intel Core i5", "ram": 16})
+
+    large = client.get("/items/", headers={**auth_headers(user), "Accept-Encoding": "gzip"})
+    small = client.get("/items/?fields=id", headers={**auth_headers(user), "Accept-Encoding": "gzip"})
+
+    assert large.headers.get("content-encoding") == "gzip"
+    assert len(large.json()) == 50
+    assert "content-encoding" not in small.headers
@@ -0,0 +1,59 @@
+import time
+from email.mime.text import MIMEText
+from smtp_stub import StubSMTPServer
+from utils.smtp_transport import SMTPConnection, SMTPPool
+
+BENCHMARK_MESSAGES = 50
+
+
+def message(number: int) -> MIMEText:
+    msg = MIMEText(f"Напоминание №{number}")
+    msg["Subject"] = "Напоминание о возврате"
+    msg["From"] = "noreply-smartlocker@example.com"
+    msg["To"] = f"user{number}@edu.hse.ru"
+    return msg
+
+
+def test_batch_goes_through_one_session():
+    with StubSMTPServer() as server:
+        pool = SMTPPool(2, "127.0.0.1", server.port, None, None, use_ssl=False)
+        results = pool.send_batch([message(number) for number in range(20)])
+        pool.close()
+
+    assert results == [None] * 20
+    assert len(server.messages) == 20
+    assert server.connections == 1
+    assert pool.sent == 20 and pool.errors == 0
+
+
+def test_reconnects_when_server_drops_session():
+    with StubSMTPServer(drop_after=3) as server:
+        pool = SMTPPool(1, "127.0.0.1", server.port, None, None, use_ssl=False)
+        results = pool.send_batch([message(number) for number in range(10)])
+        pool.close()
+
+    assert results == [None] * 10
+    assert len(server.messages) == 10
+    # Сессия обрывается после каждых трёх писем: 10 писем — 4 соединения
+    assert server.connections == 4
+
+
+def test_benchmark_pooled_vs_connection_per_message():
+    with StubSMTPServer() as server:
+        started = time.perf_counter()
+        for number in range(BENCHMARK_MESSAGES):
+            # Как было раньше: новое соединение на каждое письмо
+            connection = SMTPConnection("127.0.0.1", server.port, None, None, use_ssl=False)
+            connection.send(message(number))
+            connection.close()
+        per_message = BENCHMARK_MESSAGES / (time.perf_counter() - started)
+
+        pool = SMTPPool(1, "127.0.0.1", server.port, None, None, use_ssl=False)
+        started = time.perf_counter()
+        results = pool.send_batch([message(number) for number in range(BENCHMARK_MESSAGES)])
+        pooled = BENCHMARK_MESSAGES / (time.perf_counter() - started)
+        pool.close()
+
+    print(f"\n[bench] SMTP без пула: {per_message:.0f} писем/с, через пул: {pooled:.0f} писем/с")
+    assert results == [None] * BENCHMARK_MESSAGES
+    assert server.connections == BENCHMARK_MESSAGES + 1
@@ -0,0 +1,49 @@
+import logging
+from sqlalchemy import delete
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+from database import engine
+from models import TableVersion
+from utils import table_versions
+from utils.table_versions import bump_versions, get_versions
+
+
+def test_versions_grow_only_after_commit(db):
+    before = get_versions(db, "item", "request")
+
+    bump_versions(db, "item", "request")
+    db.rollback()
+    assert get_versions(db, "item", "request") == before
+
+    bump_versions(db, "item", "request")
+    db.commit()
+    assert get_versions(db, "item", "request") == (before[0] + 1, before[1] + 1)
+
+
+def test_missing_version_row_is_created(db):
+    db.exec(delete(TableVersion).where(TableVersion.name == "cell"))
+    db.commit()
+
+    bump_versions(db, "cell")
+    db.commit()
+    bump_versions(db, "cell")
+    db.commit()
+
+    assert get_versions(db, "cell") == (2,)
+
+
+def test_failed_bump_is_retried_then_logged_as_error(db, monkeypatch, caplog):
+    calls = []
+
+    def failing_increment(bind, names):
+        calls.append(sorted(names))
+        raise OperationalError("UPDATE tableversion", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(table_versions, "_increment", failing_increment)
+    with Session(engine) as session, caplog.at_level(logging.ERROR, logger="utils.table_versions"):
+        bump_versions(session, "item")
+        session.commit()
+
+    assert calls == [["item"]] * table_versions.BUMP_ATTEMPTS
+    assert [record.levelno for record in caplog.records] == [logging.ERROR]
+    assert "item" in caplog.records[0].getMessage()
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from typing import Collection, Dict, Iterable, Optional, Set
+from sqlalchemy import event, update
+from sqlmodel import Session, select
+from models import Cell
+
+# Размеры ячеек от меньшего к большему
+CELL_SIZES = ("S", "M", "L")
+# Как часто перечитывать карту свободных ячеек, даже если в ней ещё есть кандидаты:
+# ячейки, освобождённые другими воркерами, иначе не попадут в подбор до исчерпания карты
+FREE_MAP_TTL_SECONDS = float(os.getenv("FREE_CELL_MAP_TTL_SECONDS", "30"))
+# Ключ в session.info: ячейки, занятые или освобождённые в текущей транзакции
+_PENDING_MARKS = "cell_allocator.pending_marks"
+
+
+class NoFreeCell(Exception):
+    """Нет свободной ячейки подходящего размера."""
+
+
+class CellTaken(Exception):
+    """Запрошенная ячейка уже занята."""
+
+
+def fitting_sizes(size: Optional[str]) -> Iterable[str]:
+    # Предмет без размера помещается в любую ячейку
+    if size is None:
+        return CELL_SIZES
+    return CELL_SIZES[CELL_SIZES.index(size):]
+
+
+class FreeCellMap:
+    """
+    Битовые карты свободных ячеек по размерам в памяти процесса: бит N — ячейка с id N.
+
+    Это только подсказка, какую ячейку пробовать: занятие ячейки всё равно идёт
+    условным UPDATE в БД, поэтому устаревшая карта приводит лишь к лишней попытке.
+    """
+
+    def __init__(self):
+        self._free: Dict[str, int] = {size: 0 for size in CELL_SIZES}
+        self._size_of: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > FREE_MAP_TTL_SECONDS
+
+    def load(self, session: Session):
+        rows = session.exec(select(Cell.id, Cell.size, Cell.is_free)).all()
+        free = {size: 0 for size in CELL_SIZES}
+        size_of = {}
+        for cell_id, size, is_free in rows:
+            size_of[cell_id] = size
+            if is_free and size in free:
+                free[size] |= 1 << cell_id
+        with self._lock:
+            self._free = free
+            self._size_of = size_of
+            self._loaded_at = time.monotonic()
+
+    def first_free(self, size: str, exclude: Collection[int] = ()) -> Optional[int]:
+        with self._lock:
+            bits = self._free.get(size, 0)
+        for cell_id in exclude:
+            bits &= ~(1 << cell_id)
+        if not bits:
+            return None
+        # Младший установленный бит — ячейка с наименьшим id
+        return (bits & -bits).bit_length() - 1
+
+    def mark(self, cell_id: int, is_free: bool):
+        with self._lock:
+            size = self._size_of.get(cell_id)
+            if size not in self._free:
+                return
+            if is_free:
+                self._free[size] |= 1 << cell_id
+            else:
+                self._free[size] &= ~(1 << cell_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {size: bin(bits).count("1") for size, bits in self._free.items()}
+
+
+free_cells = FreeCellMap()
+
+
+def _pending_marks(session: Session) -> Dict[int, bool]:
+    return session.info.setdefault(_PENDING_MARKS, {})
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_marks(session):
+    # Карта меняется только после коммита: при откате ячейки в ней остаются как были
+    for cell_id, is_free in session.info.pop(_PENDING_MARKS, {}).items():
+        free_cells.mark(cell_id, is_free)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending_marks(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_PENDING_MARKS, None)
+
+
+def claim_cell(session: Session, cell_id: int) -> bool:
+    """
+    Атомарно занимает ячейку в транзакции сессии. Условный UPDATE берёт блокировку
+    строки, поэтому из двух одновременных попыток занять одну ячейку пройдёт только одна.
+    """
+    result = session.exec(
+        update(Cell).where(Cell.id == cell_id, Cell.is_free == True).values(is_free=False)
+    )
+    if result.rowcount == 1:
+        _pending_marks(session)[cell_id] = False
+        return True
+    # Ячейку уже заняла другая (закоммиченная) транзакция — карте можно это знать сразу
+    free_cells.mark(cell_id, False)
+    return False
+
+
+def claim_cells(session: Session, cell_ids: Iterable[int]) -> Set[int]:
+    """Занимает сразу несколько ячеек одним UPDATE; возвращает id тех, что были свободны."""
+    cell_ids = list(cell_ids)
+    if not cell_ids:
+        return set()
+    claimed = set(session.exec(
+        update(Cell).where(Cell.id.in_(cell_ids), Cell.is_free == True).values(is_free=False).returning(Cell.id)
+    ).scalars())
+    pending = _pending_marks(session)
+    for cell_id in cell_ids:
+        if cell_id in claimed:
+            pending[cell_id] = False
+        else:
+            free_cells.mark(cell_id, False)
+    return claimed
+
+
+def claim_specific_cell(session: Session, cell_id: int):
+    if not claim_cell(session, cell_id):
+        raise CellTaken()
+
+
+def _reload(session: Session, pending: Dict[int, bool]):
+    free_cells.load(session)
+    # Сессия видит свои незакоммиченные изменения; в карте должно остаться закоммиченное состояние
+    for cell_id, is_free in pending.items():
+        free_cells.mark(cell_id, not is_free)
+
+
+def allocate_cell(session: Session, size: Optional[str] = None) -> int:
+    """
+    Занимает наименьшую свободную ячейку, в которую помещается предмет размера size.
+    Коммит — за вызывающим кодом; при откате ячейка остаётся свободной.
+    """
+    # Ячейки, занятые или освобождённые этой же транзакцией, попадут в карту только после коммита
+    pending = _pending_marks(session)
+    if free_cells.is_stale():
+        _reload(session, pending)
+
+    reloaded = False
+    while True:
+        for cell_size in fitting_sizes(size):
+            cell_id = free_cells.first_free(cell_size, pending)
+            while cell_id is not None:
+                if claim_cell(session, cell_id):
+                    return cell_id
+                # Ячейку заняли в другом воркере — карта устарела, пробуем следующую
+                cell_id = free_cells.first_free(cell_size, pending)
+
+        if reloaded:
+            raise NoFreeCell()
+        # Карта исчерпана: перечитываем её из БД один раз, вдруг ячейки освободились
+        _reload(session, pending)
+        reloaded = True
+
+
+def release_cell(session: Session, cell_id: int):
+    session.exec(update(Cell).where(Cell.id == cell_id).values(is_free=True))
+    _pending_marks(session)[cell_id] = True
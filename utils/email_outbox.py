@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import insert
+from sqlmodel import Session
+from database import engine
+from models import EmailOutbox
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+def enqueue_email(to_email: str, subject: str, body: str, session: Optional[Session] = None) -> EmailOutbox:
+    """
+    Ставит письмо в очередь. Если передана сессия, письмо сохранится
+    вместе с её транзакцией, иначе открывается своя сессия.
+    """
+    message = EmailOutbox(to_email=to_email, subject=subject, body=body)
+
+    if session is not None:
+        session.add(message)
+        return message
+
+    with Session(engine) as own_session:
+        own_session.add(message)
+        own_session.commit()
+    return message
+
+
+def enqueue_emails(session: Session, messages: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Массовая постановка писем в очередь одним executemany в транзакции сессии.
+    messages: (to_email, subject, body). Коммит остаётся за вызывающим кодом.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "to_email": to_email,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "created": now,
+            "next_attempt_at": now,
+        }
+        for to_email, subject, body in messages
+    ]
+    if rows:
+        session.exec(insert(EmailOutbox), params=rows)
+    return len(rows)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    # Экспоненциальная задержка: 30с, 1м, 2м, ... но не больше часа
+    seconds = min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return timedelta(seconds=seconds)
+
+
+def mark_sent(message: EmailOutbox):
+    message.status = "sent"
+    message.sent_at = datetime.utcnow()
+    message.last_error = None
+
+
+def mark_failed(message: EmailOutbox, error: Exception):
+    message.attempts += 1
+    message.last_error = str(error)[:1000]
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = "failed"
+    else:
+        message.next_attempt_at = datetime.utcnow() + retry_delay(message.attempts)
@@ -1,23 +1,43 @@
-import smtplib
 from email.mime.text import MIMEText
+from typing import List, Optional, Tuple
 import os
 
+from sqlmodel import Session
+
+from utils.email_outbox import enqueue_email
+from utils.smtp_transport import SMTPPool, SMTP_HOST, SMTP_PORT, SMTP_SSL, SMTP_POOL_SIZE
+
 EMAIL_FROM = os.getenv("EMAIL_FROM")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
+smtp_pool = SMTPPool(SMTP_POOL_SIZE, SMTP_HOST, SMTP_PORT, EMAIL_FROM, EMAIL_PASSWORD, SMTP_SSL)
 
-def send_confirmation_email(to_email: str, code: str):
-    msg = MIMEText(f"Ваш код подтверждения: {code}")
-    msg["Subject"] = "Код подтверждения SmartLocker"
+
+# Все send_* функции только ставят письмо в очередь (таблица emailoutbox),
+# реальную отправку выполняет email_worker.py через deliver_batch.
+# Если передать session, письмо сохранится в транзакции вызывающего кода.
+def build_message(to_email: str, subject: str, body: str) -> MIMEText:
+    msg = MIMEText(body)
+    msg["Subject"] = subject
     msg["From"] = EMAIL_FROM
     msg["To"] = to_email
+    return msg
+
+
+def deliver_email(to_email: str, subject: str, body: str):
+    smtp_pool.send(build_message(to_email, subject, body))
 
-    with smtplib.SMTP_SSL("smtp.yandex.ru", 465) as server:
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        server.send_message(msg)
 
+def deliver_batch(messages: List[Tuple[str, str, str]]) -> List[Optional[Exception]]:
+    # messages: список (to_email, subject, body), отправляются через одну SMTP-сессию
+    return smtp_pool.send_batch([build_message(*message) for message in messages])
 
-def send_admin_request_email(user_email: str, equipment_name: str, reason: str):
+
+def send_confirmation_email(to_email: str, code: str, session: Optional[Session] = None):
+    enqueue_email(to_email, "Код подтверждения SmartLocker", f"Ваш код подтверждения: {code}", session)
+
+
+def send_admin_request_email(user_email: str, equipment_name: str, reason: str, session: Optional[Session] = None):
     from datetime import datetime, timedelta
 
     deadline = (datetime.now() + timedelta(hours=24)).strftime("%Y-%m-%d %H:%M")
@@ -31,34 +51,20 @@ def send_admin_request_email(user_email: str, equipment_name: str, reason: str):
 Пожалуйста, рассмотрите её до {deadline}.
 """
 
-    msg = MIMEText(body)
-    msg["Subject"] = f"Заявка на {equipment_name} от {user_email}"
-    msg["From"] = EMAIL_FROM
-    msg["To"] = EMAIL_FROM
-
-    with smtplib.SMTP_SSL("smtp.yandex.ru", 465) as server:
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        server.send_message(msg)
+    enqueue_email(EMAIL_FROM, f"Заявка на {equipment_name} от {user_email}", body, session)
 
 
-def send_support_message(user_email: str, message: str):
+def send_support_message(user_email: str, message: str, session: Optional[Session] = None):
     body = f"""
 Обращение от пользователя: {user_email}
 
 Текст обращения:
 {message}
 """
-    msg = MIMEText(body)
-    msg["Subject"] = f"Обращение в поддержку от {user_email}"
-    msg["From"] = EMAIL_FROM
-    msg["To"] = EMAIL_FROM
-
-    with smtplib.SMTP_SSL("smtp.yandex.ru", 465) as server:
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        server.send_message(msg)
+    enqueue_email(EMAIL_FROM, f"Обращение в поддержку от {user_email}", body, session)
 
 
-def send_temporary_password_email(to_email: str, new_password: str):
+def send_temporary_password_email(to_email: str, new_password: str, session: Optional[Session] = None):
     body = f"""
     Ваш новый пароль от SmartLocker:
 
@@ -66,22 +72,8 @@ def send_temporary_password_email(to_email: str, new_password: str):
 
     Не забудьте сменить его в личном кабинете после входа.
     """
-    msg = MIMEText(body)
-    msg["Subject"] = "Новый пароль SmartLocker"
-    msg["From"] = EMAIL_FROM
-    msg["To"] = to_email
+    enqueue_email(to_email, "Новый пароль SmartLocker", body, session)
 
-    with smtplib.SMTP_SSL("smtp.yandex.ru", 465) as server:
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        server.send_message(msg)
-
-
-def send_notification_email(to_email: str, subject: str, body: str):
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = EMAIL_FROM
-    msg["To"] = to_email
 
-    with smtplib.SMTP_SSL("smtp.yandex.ru", 465) as server:
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        server.send_message(msg)
+def send_notification_email(to_email: str, subject: str, body: str, session: Optional[Session] = None):
+    enqueue_email(to_email, subject, body, session)
@@ -0,0 +1,192 @@
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, TextIO, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+from models import Item
+from lookups import item_status
+from utils.cell_allocator import CellTaken, NoFreeCell, allocate_cell, claim_cells
+from utils.table_versions import bump_versions
+
+BATCH_SIZE = 1000
+# Сколько ошибок по строкам возвращать в отчёте; счётчик failed считает все
+MAX_REPORTED_ERRORS = 1000
+
+
+class ItemImportRow(BaseModel):
+    inv_key: str = Field(min_length=1)
+    name: str = Field(min_length=1)
+    owner: str
+    status: Optional[int] = None
+    available: bool = True
+    access_level: int = 1
+    specifications: dict = {}
+    size: Optional[Literal["S", "M", "L"]] = None
+    cell: Optional[int] = Field(default=None, ge=1, le=20)
+    allocate_cell: bool = False
+
+    @field_validator("specifications", mode="before")
+    @classmethod
+    def parse_specifications(cls, value):
+        # В CSV характеристики приходят JSON-строкой
+        if isinstance(value, str):
+            return json.loads(value) if value.strip() else {}
+        return value
+
+    @field_validator("status")
+    @classmethod
+    def check_status(cls, value):
+        # status — внешний ключ на itemstatus: неизвестный id сорвал бы вставку всей пачки
+        if value is not None and item_status.name_of(value) is None:
+            raise ValueError(f"неизвестный статус предмета {value}")
+        return value
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Построчно читает CSV (с заголовком) или JSONL, не загружая файл целиком.
+    Отдаёт (номер строки, dict) или (номер строки, ValueError) для нераспознанной строки.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Пустые ячейки CSV — отсутствующие поля, чтобы сработали значения по умолчанию
+            yield reader.line_num, {key: value for key, value in record.items() if key and value != ""}
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+            continue
+        yield line_no, record if isinstance(record, dict) else ValueError("ожидался JSON-объект")
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc']) or 'строка'}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def fail(self, line_no: int, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line_no, "error": error if isinstance(error, str) else _error_text(error)})
+
+    def as_dict(self) -> dict:
+        errors = sorted(self.errors, key=lambda error: error["row"])
+        return {"inserted": self.inserted, "failed": self.failed, "errors": errors}
+
+
+def _insert_batch(session: Session, batch: List[Tuple[int, ItemImportRow]], rejected: Dict[int, str]) -> int:
+    """Занимает ячейки и вставляет пачку; отклонённые строки складывает в rejected. Возвращает число вставленных."""
+    # Явно указанные ячейки занимаются одним UPDATE на всю пачку
+    requested = {}
+    for line_no, row in batch:
+        if row.cell is not None:
+            requested.setdefault(row.cell, line_no)
+    claimed = claim_cells(session, requested)
+
+    values = []
+    default_status = item_status.FREE
+    for line_no, row in batch:
+        cell = row.cell
+        if cell is not None and requested.get(cell) != line_no:
+            rejected[line_no] = f"cell: ячейка {cell} уже указана в строке {requested[cell]}"
+            continue
+        if cell is not None and cell not in claimed:
+            rejected[line_no] = f"cell: ячейка {cell} занята или не существует"
+            continue
+        if cell is None and row.allocate_cell:
+            try:
+                cell = allocate_cell(session, row.size)
+            except (NoFreeCell, CellTaken):
+                rejected[line_no] = "cell: нет свободной ячейки подходящего размера"
+                continue
+
+        values.append({
+            "inv_key": row.inv_key,
+            "name": row.name,
+            "owner": row.owner,
+            "status": row.status if row.status is not None else default_status,
+            "available": row.available,
+            "access_level": row.access_level,
+            "specifications": row.specifications,
+            "size": row.size,
+            "cell": cell,
+        })
+
+    if values:
+        # executemany: одна подготовленная команда на всю пачку
+        session.exec(insert(Item), params=values)
+    return len(values)
+
+
+def import_items(
+        session: Session,
+        records: Iterable[Tuple[int, object]],
+        batch_size: int = BATCH_SIZE,
+) -> ImportReport:
+    """
+    Импортирует предметы пачками по batch_size: валидация, занятие ячеек и вставка.
+    Каждая пачка коммитится отдельно, ошибочные строки пропускаются и попадают в отчёт.
+    """
+    report = ImportReport()
+    batch: List[Tuple[int, ItemImportRow]] = []
+
+    def flush():
+        if not batch:
+            return
+        rejected: Dict[int, str] = {}
+        try:
+            inserted = _insert_batch(session, batch, rejected)
+            bump_versions(session, "item", "cell")
+            session.commit()
+        except SQLAlchemyError as e:
+            # Пачка откатилась целиком вместе с занятыми ячейками; следующие пачки импортируются дальше
+            session.rollback()
+            inserted = 0
+            error = f"БД отклонила пачку строк {batch[0][0]}–{batch[-1][0]}: {getattr(e, 'orig', None) or e}"
+            for line_no, _ in batch:
+                rejected.setdefault(line_no, error)
+        report.inserted += inserted
+        for line_no, error in rejected.items():
+            report.fail(line_no, error)
+        batch.clear()
+
+    for line_no, record in records:
+        if isinstance(record, Exception):
+            report.fail(line_no, record)
+            continue
+        try:
+            batch.append((line_no, ItemImportRow.model_validate(record)))
+        except (ValidationError, ValueError) as e:
+            report.fail(line_no, e)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return report
@@ -0,0 +1,121 @@
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+import sqlalchemy.dialects.postgresql  # регистрирует to_tsvector/to_tsquery с типами Postgres
+from sqlalchemy import func, literal_column
+
+# Конфигурация 'simple': без стемминга, одинаково для русских и английских названий
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+SPEC_VALUE_TYPES = literal_column("""'["string", "numeric"]'::jsonb""")
+EMPTY_SPECS = literal_column("'{}'::jsonb")
+
+# Веса полей, как в ts_rank по умолчанию: A = 1.0, B = 0.4, C = 0.2
+WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text) -> List[str]:
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _weighted(expression, weight: str):
+    return func.setweight(expression, literal_column(f"'{weight}'"))
+
+
+def _text_vector(column):
+    return func.to_tsvector(SEARCH_CONFIG, func.coalesce(column, literal_column("''")))
+
+
+def search_document(columns):
+    """
+    tsvector предмета для Postgres: name и inv_key (вес A), значения
+    specifications (вес B), owner (вес C). По этому же выражению
+    строится GIN-индекс ix_item_search, поэтому менять их нужно вместе.
+    """
+    return (
+        _weighted(_text_vector(columns.name), "A")
+        .op("||")(_weighted(_text_vector(columns.inv_key), "A"))
+        .op("||")(_weighted(func.jsonb_to_tsvector(SEARCH_CONFIG, func.coalesce(columns.specifications, EMPTY_SPECS), SPEC_VALUE_TYPES), "B"))
+        .op("||")(_weighted(_text_vector(columns.owner), "C"))
+    )
+
+
+def search_query(tokens: List[str]):
+    # Каждое слово запроса — префикс, все слова обязательны: "mac pro" -> mac:* & pro:*
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+
+
+def _spec_values(value) -> Iterable:
+    if isinstance(value, dict):
+        for nested in value.values():
+            yield from _spec_values(nested)
+    elif isinstance(value, list):
+        for nested in value:
+            yield from _spec_values(nested)
+    elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        yield value
+
+
+class ItemSearchIndex:
+    """
+    Инвертированный индекс предметов в памяти процесса — для БД без
+    полнотекстового поиска (SQLite). Пересобирается целиком, когда меняется
+    версия таблицы item; поиск — по префиксам слов с теми же весами, что в Postgres.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: List[str] = []
+        self._items: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, version, items: List[dict]):
+        postings: Dict[str, Dict[int, float]] = {}
+
+        def add(text, item_id: int, weight: float):
+            for token in tokenize(text):
+                entry = postings.setdefault(token, {})
+                entry[item_id] = entry.get(item_id, 0.0) + weight
+
+        for item in items:
+            add(item.get("name") or "", item["id"], WEIGHTS["A"])
+            add(item.get("inv_key") or "", item["id"], WEIGHTS["A"])
+            for value in _spec_values(item.get("specifications") or {}):
+                add(value, item["id"], WEIGHTS["B"])
+            add(item.get("owner") or "", item["id"], WEIGHTS["C"])
+
+        with self._lock:
+            self._postings = postings
+            self._terms = sorted(postings)
+            self._items = {item["id"]: item for item in items}
+            self.version = version
+
+    def _prefix_scores(self, prefix: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        position = bisect_left(self._terms, prefix)
+        while position < len(self._terms) and self._terms[position].startswith(prefix):
+            for item_id, weight in self._postings[self._terms[position]].items():
+                scores[item_id] = max(scores.get(item_id, 0.0), weight)
+            position += 1
+        return scores
+
+    def search(self, tokens: List[str], limit: int, offset: int = 0) -> List[dict]:
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for token in tokens:
+                matches = self._prefix_scores(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {item_id: score + matches[item_id] for item_id, score in scores.items() if item_id in matches}
+                if not scores:
+                    return []
+
+            ranked: List[Tuple[float, int]] = sorted((-score, item_id) for item_id, score in scores.items())
+            return [self._items[item_id] for _, item_id in ranked[offset:offset + limit]]
+
+
+item_search_index = ItemSearchIndex()
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# bcrypt отпускает GIL, поэтому потоков достаточно для параллельного хеширования
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(2, (os.cpu_count() or 2) // 2))))
+# Сколько операций может ждать в очереди, прежде чем новые будут отклоняться
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+
+
+class HasherBusy(Exception):
+    """Пул хеширования и его очередь заполнены."""
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt hash/verify в отдельном ограниченном пуле потоков,
+    чтобы всплеск логинов не занимал воркеры остальных эндпоинтов.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, queue_size: int):
+        self.context = context
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy()
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self, started: float):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+        self._slots.release()
+
+    async def _run(self, fn, *args):
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(started)
+            raise
+        # Слот освобождается, когда поток действительно закончил bcrypt: если клиент отключился
+        # и корутину отменили, хеширование продолжается и занимает место в пуле до конца
+        future.add_done_callback(lambda _: self._release(started))
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_ms / self.completed, 1) if self.completed else None,
+                "max_ms": round(self.max_ms, 1),
+            }
@@ -0,0 +1,71 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+# Сколько держать запись после истечения кода: повторная попытка с
+# истёкшим кодом тоже обходится без поиска по таблице
+EXPIRED_GRACE = timedelta(minutes=10)
+PURGE_INTERVAL_SECONDS = 60
+
+
+class PostamatCodeIndex:
+    """
+    Индекс активных кодов постамата в памяти процесса: код -> (id заявки, срок действия).
+
+    Это только подсказка: у каждого воркера индекс свой, поэтому найденную
+    заявку нужно сверить с БД (код в строке заявки должен совпадать).
+    """
+
+    def __init__(self):
+        self._by_code: Dict[str, Tuple[int, Optional[datetime]]] = {}
+        self._by_request: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def put(self, code: str, request_id: int, expiry: Optional[datetime]):
+        with self._lock:
+            old_code = self._by_request.pop(request_id, None)
+            if old_code is not None:
+                self._by_code.pop(old_code, None)
+            self._by_code[code] = (request_id, expiry)
+            self._by_request[request_id] = code
+
+            if time.monotonic() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._purge_expired()
+
+    def get(self, code: str) -> Optional[int]:
+        with self._lock:
+            entry = self._by_code.get(code)
+            if entry is None:
+                return None
+            request_id, expiry = entry
+            if expiry and datetime.utcnow() > expiry + EXPIRED_GRACE:
+                self._remove(code)
+                return None
+            return request_id
+
+    def discard(self, code: str):
+        with self._lock:
+            self._remove(code)
+
+    def discard_request(self, request_id: int):
+        with self._lock:
+            code = self._by_request.get(request_id)
+            if code is not None:
+                self._remove(code)
+
+    def _remove(self, code: str):
+        entry = self._by_code.pop(code, None)
+        if entry is not None:
+            self._by_request.pop(entry[0], None)
+
+    def _purge_expired(self):
+        threshold = datetime.utcnow() - EXPIRED_GRACE
+        for code, (_, expiry) in list(self._by_code.items()):
+            if expiry and expiry < threshold:
+                self._remove(code)
+        self._last_purge = time.monotonic()
+
+
+postamat_codes = PostamatCodeIndex()
@@ -0,0 +1,125 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import List, Optional
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.yandex.ru")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+# Через сколько секунд простоя соединение проверяется NOOP перед отправкой
+SMTP_IDLE_CHECK_SECONDS = 30
+
+
+class SMTPConnection:
+    """Одна авторизованная SMTP-сессия, которая переоткрывается при обрыве."""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str], use_ssl: bool):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+        # Локальный тестовый сервер обычно не требует авторизации
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+
+    def _is_alive(self) -> bool:
+        if self._server is None:
+            return False
+        if time.monotonic() - self._last_used < SMTP_IDLE_CHECK_SECONDS:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg: Message):
+        if not self._is_alive():
+            self.close()
+            self._connect()
+
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Сервер закрыл сессию между письмами — переподключаемся один раз
+            self.close()
+            self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+class SMTPPool:
+    """Пул долгоживущих SMTP-сессий, общий для всех отправителей процесса."""
+
+    def __init__(self, size: int, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_ssl: bool):
+        self._connections = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._connections.put(SMTPConnection(host, port, username, password, use_ssl))
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.errors = 0
+
+    @contextmanager
+    def connection(self):
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def send_batch(self, messages: List[Message]) -> List[Optional[Exception]]:
+        """
+        Отправляет пачку писем через одно соединение.
+        Возвращает список ошибок по позициям (None — письмо отправлено).
+        """
+        results: List[Optional[Exception]] = []
+        with self.connection() as conn:
+            for msg in messages:
+                try:
+                    conn.send(msg)
+                    results.append(None)
+                except Exception as e:
+                    conn.close()
+                    results.append(e)
+
+        with self._lock:
+            self.errors += sum(1 for error in results if error is not None)
+            self.sent += sum(1 for error in results if error is None)
+        return results
+
+    def send(self, msg: Message):
+        error = self.send_batch([msg])[0]
+        if error is not None:
+            raise error
+
+    def close(self):
+        for _ in range(self._connections.qsize()):
+            conn = self._connections.get_nowait()
+            conn.close()
+            self._connections.put_nowait(conn)
@@ -0,0 +1,102 @@
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import TableVersion
+
+TRACKED_TABLES = ("item", "request", "cell")
+
+# Ключи в session.info: таблицы, изменённые в текущей транзакции, и уже закоммиченные
+_PENDING = "table_versions.pending"
+_COMMITTED = "table_versions.committed"
+# Сколько раз пробовать увеличить версии, прежде чем сдаться
+BUMP_ATTEMPTS = 2
+# INSERT ... ON CONFLICT DO UPDATE для поддерживаемых СУБД
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+logger = logging.getLogger(__name__)
+
+
+def versions_statement(*names: str):
+    return select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(names))
+
+
+def _ordered(rows, names) -> Tuple[int, ...]:
+    versions = dict(rows)
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def get_versions(session: Session, *names: str) -> Tuple[int, ...]:
+    return _ordered(session.exec(versions_statement(*names)).all(), names)
+
+
+async def get_versions_async(session: AsyncSession, *names: str) -> Tuple[int, ...]:
+    return _ordered((await session.exec(versions_statement(*names))).all(), names)
+
+
+async def get_table_state_async(session: AsyncSession, *names: str) -> Tuple[Tuple[int, ...], Optional[datetime]]:
+    """Версии таблиц и время последнего изменения любой из них (для ETag/Last-Modified)."""
+    rows = (await session.exec(
+        select(TableVersion.name, TableVersion.version, TableVersion.updated).where(TableVersion.name.in_(names))
+    )).all()
+    versions = _ordered(((name, version) for name, version, _ in rows), names)
+    updated = max((row_updated for _, _, row_updated in rows), default=None)
+    return versions, updated
+
+
+def bump_versions(session: Session, *names: str):
+    """
+    Отмечает таблицы как изменённые в транзакции сессии. Сами счётчики
+    увеличиваются отдельной короткой транзакцией после успешного коммита
+    (при откате — не увеличиваются), поэтому строки tableversion не остаются
+    заблокированными на всё время пишущей транзакции.
+    """
+    session.info.setdefault(_PENDING, set()).update(names)
+
+
+def _increment(bind, names):
+    now = datetime.utcnow()
+    upsert = _UPSERTS[bind.dialect.name]
+    # Строки блокируются всегда в одном порядке, чтобы параллельные вызовы не взаимоблокировались.
+    # Upsert: без строки tableversion (база без init_data.py/0002) версия иначе навсегда осталась бы 0
+    with bind.begin() as connection:
+        for name in sorted(names):
+            connection.execute(
+                upsert(TableVersion)
+                .values(name=name, version=1, updated=now)
+                .on_conflict_do_update(
+                    index_elements=[TableVersion.name],
+                    set_={"version": TableVersion.version + 1, "updated": now},
+                )
+            )
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed(session):
+    names = session.info.pop(_PENDING, None)
+    if names:
+        session.info.setdefault(_COMMITTED, set()).update(names)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _bump_committed(session, transaction):
+    # Срабатывает и после коммита, и после отката, когда соединение сессии уже освобождено
+    if transaction.parent is not None:
+        return
+    session.info.pop(_PENDING, None)
+    names = session.info.pop(_COMMITTED, None)
+    if not names:
+        return
+    for attempt in range(1, BUMP_ATTEMPTS + 1):
+        try:
+            _increment(session.get_bind(), names)
+            return
+        except SQLAlchemyError:
+            if attempt == BUMP_ATTEMPTS:
+                # Данные уже закоммичены, откатывать нечего; но кэши и ETag по этим таблицам
+                # останутся устаревшими до следующего изменения — это ошибка, а не предупреждение
+                logger.exception("Не удалось увеличить версии таблиц %s: кэши устарели", sorted(names))